@@ -0,0 +1,251 @@
+"""Admission control for the model-backed tools.
+
+Each gate caps how many runs of one kind of work (BART summaries, Whisper,
+TTS, NLTK generators) happen at once in this process, with a bounded wait
+queue in front. A request is turned away at once with 429 and Retry-After
+when the queue is full, when the wait estimated from recent run times is
+longer than the caller can wait, or when the user already holds their
+share of the gate. Queued work is served round-robin across users, so
+one user's backlog never starves everyone else.
+
+    with admission.slot("nltk", current_user.id): ...       # request waits for a slot
+    admission.submit("summarize", user_id, fn, *args)        # background job, runs when a slot frees
+    admission.check("video", current_user.id)                # shed load before reading an upload
+
+All of them raise Overloaded, which the blueprint answers with a 429.
+Limits are per process: under a pre-fork server (wsgi.py) each worker
+has its own gates, sized for its share of the cores.
+
+Override any gate with ADMISSION_GATES, e.g. "video=2/10/1800,nltk=4/50/30"
+(concurrent runs / queued / longest estimated wait in seconds).
+"""
+from flask import Blueprint, jsonify
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import math
+import os
+import threading
+import time
+from utils import admin_required
+
+admission_bp = Blueprint("admission_bp", __name__)
+
+# CONFIG
+# Longest a request thread waits for a slot; background jobs wait up to the gate's max_wait
+SYNC_MAX_WAIT_SECONDS = float(os.environ.get("ADMISSION_SYNC_MAX_WAIT_SECONDS", 30))
+EWMA_ALPHA = 0.2
+
+# name: (concurrent runs, queued, longest estimated wait in seconds, typical run in seconds until measured)
+GATE_DEFAULTS = {
+    "summarize": (int(os.environ.get("SUMMARIZE_WORKERS", 1)), 20, 900, 60),
+    "video": (int(os.environ.get("VIDEO_JOB_WORKERS", 2)), 10, 1800, 300),
+    "tts": (int(os.environ.get("TTS_WORKERS", 1)), int(os.environ.get("TTS_QUEUE_SIZE", 16)), 1800, 120),
+    "nltk": (max(1, (os.cpu_count() or 1) // 2), 50, 30, 2),
+}
+for item in os.environ.get("ADMISSION_GATES", "").split(","):
+    if "=" in item:
+        name, spec = item.split("=", 1)
+        try:
+            limit, queued, max_wait = (float(v) for v in spec.split("/"))
+            typical = GATE_DEFAULTS.get(name.strip(), (0, 0, 0, 10))[3]
+            GATE_DEFAULTS[name.strip()] = (max(int(limit), 1), int(queued), max_wait, typical)
+        except ValueError:
+            pass
+
+class Overloaded(Exception):
+    def __init__(self, gate, reason, retry_after):
+        super().__init__(f"The {gate} service is busy, try again in {retry_after} s")
+        self.gate = gate
+        self.reason = reason
+        self.retry_after = retry_after
+
+class Ticket:
+    __slots__ = ("user_id", "event", "job", "granted", "released", "queued_at", "started_at")
+
+    def __init__(self, user_id, job=None):
+        self.user_id = user_id
+        self.event = threading.Event()
+        self.job = job
+        self.granted = self.released = False
+        self.queued_at = time.monotonic()
+        self.started_at = None
+
+class Gate:
+    def __init__(self, name, limit, queue_size, max_wait, typical_seconds, per_user=None):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        # A user's running + queued work, at most
+        self.per_user = per_user or max(1, (limit + queue_size) // 4)
+        self._lock = threading.Lock()
+        self._waiting = OrderedDict()  # user_id -> deque of tickets; order is the round-robin turn
+        self._queued = 0
+        self._running = 0
+        self._held = Counter()
+        self._avg_run = float(typical_seconds)
+        self._avg_wait = 0.0
+        self._pool = None
+        self.stats = Counter()
+
+    # ----- estimates (lock held) -----
+    def _estimated_wait(self):
+        if self._running < self.limit and not self._queued:
+            return 0.0
+        return self._avg_run * math.ceil((self._queued + 1) / self.limit)
+
+    def _reject(self, reason, wait):
+        self.stats["rejected_" + reason] += 1
+        return Overloaded(self.name, reason, max(1, min(int(math.ceil(wait)), 3600)))
+
+    def _check(self, user_id, max_wait):
+        if self._held[user_id] >= self.per_user:
+            return self._reject("user_share", self._avg_run)
+        if self._running < self.limit and not self._queued:
+            return None
+        if self._queued >= self.queue_size:
+            return self._reject("queue_full", self._estimated_wait())
+        wait = self._estimated_wait()
+        if wait > max_wait:
+            return self._reject("wait_too_long", wait)
+        return None
+
+    # ----- admission -----
+    def check(self, user_id, max_wait=None):
+        """Raise Overloaded if a request from user_id would be turned away right now."""
+        with self._lock:
+            error = self._check(user_id, self.max_wait if max_wait is None else max_wait)
+        if error:
+            raise error
+
+    def _admit(self, ticket, max_wait):
+        with self._lock:
+            error = self._check(ticket.user_id, max_wait)
+            if error:
+                raise error
+            self.stats["admitted"] += 1
+            self._held[ticket.user_id] += 1
+            self._waiting.setdefault(ticket.user_id, deque()).append(ticket)
+            self._queued += 1
+            granted = self._dispatch()
+            self.stats["peak_queued"] = max(self.stats["peak_queued"], self._queued)
+        self._start(granted)
+
+    def _dispatch(self):
+        """Grant free slots to waiting users in turn (lock held); returns the granted tickets."""
+        granted = []
+        while self._running < self.limit and self._waiting:
+            user_id, tickets = next(iter(self._waiting.items()))
+            ticket = tickets.popleft()
+            del self._waiting[user_id]
+            if tickets:
+                self._waiting[user_id] = tickets  # back of the line
+            self._queued -= 1
+            self._running += 1
+            ticket.granted = True
+            ticket.started_at = time.monotonic()
+            waited = ticket.started_at - ticket.queued_at
+            self._avg_wait += EWMA_ALPHA * (waited - self._avg_wait)
+            granted.append(ticket)
+        return granted
+
+    def _start(self, granted):
+        for ticket in granted:
+            if ticket.job is None:
+                ticket.event.set()
+            else:
+                self._get_pool().submit(self._run_job, ticket)
+
+    def _get_pool(self):
+        # Created on first use, after any fork; never queues: at most limit jobs hold a slot
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.limit, thread_name_prefix=f"{self.name}-job")
+            return self._pool
+
+    def _run_job(self, ticket):
+        fn, args, kwargs = ticket.job
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            print(f"[ERROR] {self.name} job failed:", e)
+        finally:
+            self.release(ticket)
+
+    def acquire(self, user_id, max_wait=None):
+        """Block until a slot is free; returns the ticket to release. Raises Overloaded."""
+        max_wait = SYNC_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        ticket = Ticket(user_id)
+        self._admit(ticket, max_wait)
+        if not ticket.event.wait(max_wait):
+            with self._lock:
+                if not ticket.granted:
+                    tickets = self._waiting.get(user_id)
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del self._waiting[user_id]
+                    self._queued -= 1
+                    self._held[user_id] -= 1
+                    if not self._held[user_id]:
+                        del self._held[user_id]
+                    self.stats["timed_out"] += 1
+                    raise Overloaded(self.name, "timed_out", max(1, int(math.ceil(self._estimated_wait()))))
+        return ticket
+
+    def release(self, ticket):
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._running -= 1
+            self._held[ticket.user_id] -= 1
+            if not self._held[ticket.user_id]:
+                del self._held[ticket.user_id]
+            self._avg_run += EWMA_ALPHA * ((time.monotonic() - ticket.started_at) - self._avg_run)
+            self.stats["completed"] += 1
+            granted = self._dispatch()
+        self._start(granted)
+
+    def submit(self, user_id, fn, *args, **kwargs):
+        """Queue fn to run once a slot is free; raises Overloaded instead of queueing past the limits."""
+        self._admit(Ticket(user_id, (fn, args, kwargs)), self.max_wait)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, gate=self.name, limit=self.limit, queue_size=self.queue_size,
+                        max_wait_seconds=self.max_wait, per_user=self.per_user, running=self._running,
+                        queued=self._queued, users_waiting=len(self._waiting),
+                        estimated_wait_seconds=round(self._estimated_wait(), 1),
+                        avg_run_seconds=round(self._avg_run, 2), avg_wait_seconds=round(self._avg_wait, 2))
+
+_gates = {name: Gate(name, *spec) for name, spec in GATE_DEFAULTS.items()}
+
+def gate(name):
+    return _gates[name]
+
+def check(name, user_id, max_wait=None):
+    _gates[name].check(user_id, max_wait)
+
+def submit(name, user_id, fn, *args, **kwargs):
+    _gates[name].submit(user_id, fn, *args, **kwargs)
+
+@contextmanager
+def slot(name, user_id, max_wait=None):
+    ticket = _gates[name].acquire(user_id, max_wait)
+    try:
+        yield
+    finally:
+        _gates[name].release(ticket)
+
+# ----------------- Routes -----------------
+@admission_bp.app_errorhandler(Overloaded)
+def overloaded(e):
+    return jsonify({"status": "busy", "error": str(e), "message": str(e), "gate": e.gate, "reason": e.reason,
+                    "retry_after": e.retry_after}), 429, {"Retry-After": str(e.retry_after)}
+
+@admission_bp.route("/admin/admission")
+@admin_required
+def admission_metrics():
+    """Queue depth, rejections and run / wait times per gate for this worker process."""
+    return jsonify({"pid": os.getpid(), "gates": [g.snapshot() for g in _gates.values()]})
@@ -1,4 +1,4 @@
-from flask import Flask,g, render_template, request, jsonify, redirect, url_for
+from flask import Blueprint, Flask, current_app, g, render_template, request, jsonify, redirect, url_for
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user, UserMixin
 import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -7,13 +7,22 @@ import os
 from datetime import datetime, date
 from video_summarizer import video_bp
 from utils import record_tool_usage
-from pdf_to_audio import pdf_bp
-from flashcards import flashcards_bp
-from study_planner import study_bp
-from resources import resources_bp   
-
-# 1️⃣ Define Flask app first
-app = Flask(__name__)
+from pdf_to_audio import pdf_bp, init_audiobooks_db, start_audiobook_sweeper
+from flashcards import flashcards_bp, init_flashcards_db
+from study_planner import study_bp, init_study_plans_db
+from resources import resources_bp, init_bookmarks_db   
+from profiler import profiler_bp
+from transcript_cache import init_transcript_cache
+from artifacts import artifacts_bp, init_artifacts_db, start_artifact_sweeper
+from retention import retention_bp, init_retention_db, start_retention_scheduler
+import admission
+from admission import admission_bp
+import progress
+from progress import progress_bp, init_progress_db
+from uploads import uploads_bp, init_uploads_db, start_upload_sweeper, claim_upload, upload_limit
+
+# Routes defined in this module; the tools live in their own blueprints
+main_bp = Blueprint("main", __name__)
 
 DATABASE = "users.db"
 DB_PATH = "database.db" 
@@ -25,7 +34,6 @@ def get_db():
         g.db.row_factory = sqlite3.Row
     return g.db
 
-@app.teardown_appcontext
 def close_db(exception):
     """Close the DB at the end of request."""
     db = g.pop('db', None)
@@ -37,31 +45,21 @@ try:
     from summarizer import extract_text_from_pdf, summarize_text
 except Exception:
     def extract_text_from_pdf(path): return ""
-    def summarize_text(text, word_count=150): return "Summary placeholder."
+    def summarize_text(text, word_count=150, on_progress=None): return "Summary placeholder."
 
 try:
     from quiz_generator import generate_quiz
 except Exception:
     def generate_quiz(topic, num_questions): return {"error": "quiz generator missing"}
 
-# -------------------- App Setup --------------------
-app = Flask(__name__)
-app.secret_key = "your_secret_key_here"
-app.register_blueprint(video_bp)
-app.register_blueprint(pdf_bp)
-app.register_blueprint(flashcards_bp)
-app.register_blueprint(study_bp)
-app.register_blueprint(resources_bp)
+# -------------------- Login --------------------
 login_manager = LoginManager()
-login_manager.login_view = "login"
-login_manager.init_app(app)
+login_manager.login_view = "main.login"
 
 # -------------------- Folders & Config --------------------
 DATABASE = "users.db"
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10 MB max file
 
 # -------------------- User Model --------------------
 class User(UserMixin):
@@ -174,10 +172,18 @@ def init_db():
         )
     ''')
     conn.commit()
+    init_study_plans_db(conn)
+    init_bookmarks_db(conn)
+    init_flashcards_db(conn)
+    init_transcript_cache(conn)
+    init_artifacts_db(conn)
+    init_audiobooks_db(conn)
+    # activity_summary + incremental vacuum for old activity rows
+    init_retention_db(conn)
+    init_progress_db(conn)
+    init_uploads_db(conn)
     conn.close()
 
-init_db()
-
 # -------------------- Utility functions --------------------
 def record_login_activity(user_id):
     conn = sqlite3.connect(DATABASE)
@@ -223,11 +229,11 @@ def record_quiz_attempt(user_id, score, total_questions=None):
 
 
 # -------------------- Routes --------------------
-@app.route("/")
+@main_bp.route("/")
 def index():
     return render_template("index.html")
 
-@app.route("/dashboard")
+@main_bp.route("/dashboard")
 @login_required
 def dashboard():
     # record today's login/activity visit
@@ -238,7 +244,7 @@ def dashboard():
     # Render dashboard page (counts will be fetched via AJAX)
     return render_template("dashboard.html", user_name=current_user.name)
 
-@app.route("/api/dashboard_data")
+@main_bp.route("/api/dashboard_data")
 @login_required
 def api_dashboard_data():
     try:
@@ -256,6 +262,13 @@ def api_dashboard_data():
                 d = ts[:10]
                 login_dates[d] = login_dates.get(d, 0) + 1
 
+        # Older activity is rolled up into activity_summary by retention.py
+        cur.execute("SELECT event, day, count FROM activity_summary WHERE user_id = ?", (uid,))
+        summary_rows = cur.fetchall()
+        for r in summary_rows:
+            if r["event"] == "login":
+                login_dates[r["day"]] = login_dates.get(r["day"], 0) + r["count"]
+
         # ----- Quiz attempts -----
         cur.execute("PRAGMA table_info(quiz_attempts)")
         columns = [col["name"] for col in cur.fetchall()]
@@ -284,6 +297,9 @@ def api_dashboard_data():
         )
         tool_rows = cur.fetchall()
         tool_usage = {r["tool_name"]: r["cnt"] for r in tool_rows} if tool_rows else {}
+        for r in summary_rows:
+            if r["event"] != "login":
+                tool_usage[r["event"]] = tool_usage.get(r["event"], 0) + r["count"]
 
         # Ensure all tools exist
         tools_list = ["PDF Summarizer", "Quiz Generator", "Video Summarizer", "PDF to Audio", "Flashcards","Adaptive Study Planner"]
@@ -321,7 +337,7 @@ def api_dashboard_data():
         return jsonify({"error": str(e)}), 500
 
 # Route to record quiz attempt (call from your quiz submission JS)
-@app.route('/record_quiz_attempt', methods=['POST'])
+@main_bp.route('/record_quiz_attempt', methods=['POST'])
 @login_required
 def record_quiz_attempt():
     try:
@@ -351,24 +367,24 @@ def record_quiz_attempt():
         return jsonify({"error": str(e)}), 500
 
 # Route to add schedule entry
-@app.route("/add_schedule", methods=["POST"])
+@main_bp.route("/add_schedule", methods=["POST"])
 @login_required
 def add_schedule():
     title = request.form.get("title", "").strip()
     date_str = request.form.get("date", "").strip()  # expected YYYY-MM-DD
     notes = request.form.get("notes", "").strip()
     if not title or not date_str:
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
     conn = sqlite3.connect(DATABASE)
     cur = conn.cursor()
     cur.execute("INSERT INTO schedules (user_id, title, date, notes, created_at) VALUES (?, ?, ?, ?, ?)",
                 (current_user.id, title, date_str, notes, datetime.utcnow().isoformat()))
     conn.commit()
     conn.close()
-    return redirect(url_for("dashboard"))
+    return redirect(url_for("main.dashboard"))
 
 # -------------------- Existing features kept intact --------------------
-@app.route("/signup", methods=["GET", "POST"])
+@main_bp.route("/signup", methods=["GET", "POST"])
 def signup():
     if request.method == "POST":
         name = request.form.get("name").strip()
@@ -385,10 +401,10 @@ def signup():
 
         user = User.create(name, email, password)
         login_user(user)
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
     return render_template("signup.html")
 
-@app.route("/login", methods=["GET", "POST"])
+@main_bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         email = request.form.get("email").strip().lower()
@@ -402,89 +418,124 @@ def login():
             record_login_activity(user.id)
         except Exception:
             pass
-        return redirect(url_for("dashboard"))
+        return redirect(url_for("main.dashboard"))
     return render_template("login.html")
 
-@app.route("/features")
+@main_bp.route("/features")
 def features():
     return render_template("features.html")
 
-@app.route("/about")
+@main_bp.route("/about")
 def about():
     return render_template("about.html")
 
-@app.route("/contact")
+@main_bp.route("/contact")
 def contact():
     return render_template("contact.html")
 
-@app.route("/logout")
+@main_bp.route("/logout")
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for("index"))
+    return redirect(url_for("main.index"))
 
-@app.route("/summarizer_tool")
+@main_bp.route("/summarizer_tool")
 @login_required
 def summarizer_page():
     return render_template("summarizer.html", user_name=current_user.name)
 
-@app.route("/summarize", methods=["POST"])
-@login_required
-def summarize():
+def run_summary_job(job_id, user_id, file_path, word_limit):
     try:
-        if "pdf_file" not in request.files:
-            return jsonify({"error": "No PDF file uploaded"}), 400
-
-        file = request.files["pdf_file"]
-        if file.filename == "":
-            return jsonify({"error": "No file selected"}), 400
-
-        # Save file temporarily
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(file_path)
-
-        # Get word limit
-        word_limit = request.form.get("word_limit", 150)
-        try:
-            word_limit = int(word_limit)
-        except:
-            word_limit = 150
-
         # Extract text and summarize
+        progress.publish(job_id, state="running", stage="extracting", progress=5)
         text = extract_text_from_pdf(file_path)
-        summary = summarize_text(text, word_count=word_limit)
+        progress.publish(job_id, stage="summarizing", progress=10)
+        summary = summarize_text(text, word_count=word_limit, on_progress=lambda done, total:
+                                 progress.publish(job_id, progress=10 + int(89 * done / total)))
 
         # Increment usage counter and record tool usage
         conn = sqlite3.connect(DATABASE)
         cur = conn.cursor()
-        cur.execute("UPDATE users SET summarizer_count = COALESCE(summarizer_count,0) + 1 WHERE id = ?", (current_user.id,))
+        cur.execute("UPDATE users SET summarizer_count = COALESCE(summarizer_count,0) + 1 WHERE id = ?", (user_id,))
         conn.commit()
         conn.close()
-        record_tool_usage(current_user.id, "PDF Summarizer")
+        record_tool_usage(user_id, "PDF Summarizer")
 
+        progress.publish(job_id, state="done", stage="done", progress=100, summary=summary)
+    except Exception as e:
+        progress.fail(job_id, e)
+    finally:
         # Clean up uploaded file
         if os.path.exists(file_path):
             os.remove(file_path)
 
-        return jsonify({"summary": summary})
+@main_bp.route("/summarize", methods=["POST"])
+@login_required
+@upload_limit("summarizer")
+def summarize():
+    """Start a summary job; follow it on the progress bus, the summary arrives with the "done" state.
+
+    Takes the PDF as pdf_file, or as upload_id from a finished chunked upload.
+    Jobs run on the "summarize" admission gate (SUMMARIZE_WORKERS at a time).
+    """
+    # Turn away before reading the upload when the queue can't take it
+    admission.check("summarize", current_user.id)
+    try:
+        upload_id = request.form.get("upload_id")
+        if upload_id:
+            upload = claim_upload(upload_id, current_user.id, "summarizer", current_app.config["UPLOAD_FOLDER"])
+            if upload is None:
+                return jsonify({"error": "Unknown or unfinished upload"}), 400
+            file_path = upload["path"]
+        else:
+            if "pdf_file" not in request.files:
+                return jsonify({"error": "No PDF file uploaded"}), 400
+
+            file = request.files["pdf_file"]
+            if file.filename == "":
+                return jsonify({"error": "No file selected"}), 400
+
+            # Save file temporarily (unique name: jobs run concurrently)
+            filename = secure_filename(file.filename) or "document.pdf"
+            file_path = os.path.join(current_app.config["UPLOAD_FOLDER"], f"{os.urandom(8).hex()}_{filename}")
+            file.save(file_path)
+
+        # Get word limit
+        word_limit = request.form.get("word_limit", 150)
+        try:
+            word_limit = int(word_limit)
+        except:
+            word_limit = 150
+
+        job_id = progress.create_job(current_user.id, "PDF Summarizer")
+        try:
+            admission.submit("summarize", current_user.id, run_summary_job, job_id, current_user.id, file_path,
+                             word_limit)
+        except admission.Overloaded:
+            progress.discard(job_id)
+            os.remove(file_path)
+            raise
+        return jsonify(progress.job_urls(job_id)), 202
+    except admission.Overloaded:
+        raise
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/quiz_tool")
+@main_bp.route("/quiz_tool")
 @login_required
 def quiz_tool():
     return render_template("quiz_tool.html", user_name=current_user.name)
 
 # -------------------- Generate Quiz API --------------------
-@app.route("/generate_quiz", methods=["POST"])
+@main_bp.route("/generate_quiz", methods=["POST"])
 @login_required
 def generate_quiz_route():
     topic = request.form.get("topic")
     num_questions = int(request.form.get("num_questions", 5))
 
-    quiz = generate_quiz(topic, num_questions)
+    with admission.slot("nltk", current_user.id):
+        quiz = generate_quiz(topic, num_questions)
     if "error" in quiz:
         return jsonify({"error": quiz["error"]}), 400
 
@@ -500,13 +551,13 @@ def generate_quiz_route():
 
 
 # PDF Summarizer page
-@app.route("/pdf_summarizer")
+@main_bp.route("/pdf_summarizer")
 @login_required
 def pdf_summarizer():
     return render_template("summarizer.html", user_name=current_user.name)
 
 # Quiz Generator page
-@app.route("/quiz_generator")
+@main_bp.route("/quiz_generator")
 @login_required
 def quiz_generator():
     return render_template("quiz_tool.html", user_name=current_user.name)
@@ -527,14 +578,14 @@ def record_tool_usage(user_id, tool_name):
         print("Error recording tool usage:", e)
 
 # -------------------- Calendar (FullCalendar) API --------------------
-@app.route("/get_events")
+@main_bp.route("/get_events")
 @login_required
 def get_events():
     """Return all events for the logged-in user."""
     conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row
     cur = conn.cursor()
-    cur.execute("SELECT id, title, date, notes FROM schedules WHERE user_id = ?", (current_user.id,))
+    cur.execute("SELECT id, title, date, end_date, notes FROM schedules WHERE user_id = ?", (current_user.id,))
     rows = cur.fetchall()
     conn.close()
 
@@ -544,12 +595,13 @@ def get_events():
             "id": r["id"],
             "title": r["title"],
             "start": r["date"],  # FullCalendar expects 'start'
+            "end": r["end_date"],
             "description": r["notes"]
         })
     return jsonify(events)
 
 
-@app.route("/add_event", methods=["POST"])
+@main_bp.route("/add_event", methods=["POST"])
 @login_required
 def add_event():
     """Add a new event to the schedules table."""
@@ -572,6 +624,37 @@ def add_event():
     return jsonify({"message": "Event added successfully"})
 
 
+# -------------------- App Factory --------------------
+def start_background_jobs():
+    """Periodic maintenance threads; run them in one process only."""
+    start_retention_scheduler()
+    start_artifact_sweeper()
+    start_audiobook_sweeper()
+    start_upload_sweeper()
+
+def create_app(start_background=True):
+    """Build the app and make sure the schema exists.
+
+    Pre-fork servers pass start_background=False and start the maintenance
+    threads after forking, in a single worker (see wsgi.py).
+    """
+    app = Flask(__name__)
+    app.secret_key = "your_secret_key_here"
+    app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+    # Tool uploads have their own limits (uploads.TOOL_MAX_BYTES); this covers every other request
+    app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
+    app.teardown_appcontext(close_db)
+    for bp in (main_bp, video_bp, pdf_bp, flashcards_bp, study_bp, resources_bp, profiler_bp,
+               retention_bp, artifacts_bp, progress_bp, uploads_bp, admission_bp):
+        app.register_blueprint(bp)
+    login_manager.init_app(app)
+
+    init_db()
+    if start_background:
+        start_background_jobs()
+    return app
+
 # -------------------- Run App --------------------
 if __name__ == "__main__":
-    app.run(debug=True, use_reloader=False)
+    # Single-process development server; see wsgi.py for production
+    create_app().run(debug=True, use_reloader=False)
@@ -0,0 +1,172 @@
+"""Store for generated files (video summaries, PDF audio).
+
+Every artifact gets an opaque id, belongs to one user (or to nobody, for
+shared content such as deduplicated audiobooks) and expires after a TTL. A background sweeper deletes expired files and, when the store is
+over its size cap, the least recently downloaded ones. Downloads go
+through ``/artifacts/<id>`` which supports Range and conditional GETs.
+"""
+from flask import Blueprint, send_file, abort
+from flask_login import current_user, login_required
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+artifacts_bp = Blueprint("artifacts_bp", __name__)
+
+# CONFIG
+DB_PATH = "users.db"
+ARTIFACT_FOLDER = os.path.abspath("artifacts")
+ARTIFACT_TTL_HOURS = float(os.environ.get("ARTIFACT_TTL_HOURS", 72))
+ARTIFACT_MAX_BYTES = int(float(os.environ.get("ARTIFACT_MAX_MB", 2048)) * 1024 * 1024)
+SWEEP_INTERVAL_SECONDS = int(os.environ.get("ARTIFACT_SWEEP_SECONDS", 600))
+
+def get_conn():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_artifacts_db(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS artifacts (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            kind TEXT NOT NULL,
+            download_name TEXT NOT NULL,
+            mimetype TEXT NOT NULL,
+            size INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            expires_at TEXT NOT NULL,
+            last_access TEXT NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_expires ON artifacts(expires_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_access ON artifacts(last_access)")
+    conn.commit()
+    os.makedirs(ARTIFACT_FOLDER, exist_ok=True)
+
+def artifact_path(artifact_id):
+    return os.path.join(ARTIFACT_FOLDER, artifact_id)
+
+# ----------------- Create -----------------
+def reserve_artifact(user_id, kind, download_name, mimetype, ttl_hours=None):
+    """Register a new artifact and return (id, path); the caller writes the file, then calls finalize_artifact."""
+    artifact_id = secrets.token_urlsafe(18)
+    now = datetime.utcnow()
+    expires = now + timedelta(hours=ttl_hours if ttl_hours is not None else ARTIFACT_TTL_HOURS)
+    conn = get_conn()
+    with conn:
+        conn.execute("""
+            INSERT INTO artifacts (id, user_id, kind, download_name, mimetype, created_at, expires_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (artifact_id, user_id, kind, download_name, mimetype, now.isoformat(), expires.isoformat(), now.isoformat()))
+    conn.close()
+    os.makedirs(ARTIFACT_FOLDER, exist_ok=True)
+    return artifact_id, artifact_path(artifact_id)
+
+def finalize_artifact(artifact_id):
+    """Record the final size once the file has been written."""
+    path = artifact_path(artifact_id)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    conn = get_conn()
+    with conn:
+        conn.execute("UPDATE artifacts SET size = ? WHERE id = ?", (size, artifact_id))
+    conn.close()
+
+def create_artifact(user_id, kind, download_name, mimetype, data):
+    """Store bytes or text as a new artifact; returns its id."""
+    artifact_id, path = reserve_artifact(user_id, kind, download_name, mimetype)
+    with open(path, "wb") as f:
+        f.write(data.encode("utf-8") if isinstance(data, str) else data)
+    finalize_artifact(artifact_id)
+    return artifact_id
+
+def artifact_url(artifact_id):
+    return f"/artifacts/{artifact_id}"
+
+# ----------------- Eviction -----------------
+def delete_artifacts(conn, ids):
+    for artifact_id in ids:
+        try:
+            os.remove(artifact_path(artifact_id))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print("[WARN] Removing artifact failed:", e)
+    with conn:
+        conn.executemany("DELETE FROM artifacts WHERE id = ?", [(i,) for i in ids])
+
+def sweep(max_bytes=None):
+    """Delete expired artifacts, then least recently used ones until under the size cap."""
+    max_bytes = ARTIFACT_MAX_BYTES if max_bytes is None else max_bytes
+    conn = get_conn()
+    try:
+        now = datetime.utcnow().isoformat()
+        expired = [r["id"] for r in conn.execute("SELECT id FROM artifacts WHERE expires_at <= ?", (now,))]
+        delete_artifacts(conn, expired)
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        evicted = []
+        if total > max_bytes:
+            for r in conn.execute("SELECT id, size FROM artifacts ORDER BY last_access"):
+                if total <= max_bytes:
+                    break
+                evicted.append(r["id"])
+                total -= r["size"]
+            delete_artifacts(conn, evicted)
+
+        # Files on disk with no row (left behind by a crash). List files before rows:
+        # a row is always inserted before its file is created.
+        on_disk = os.listdir(ARTIFACT_FOLDER) if os.path.isdir(ARTIFACT_FOLDER) else []
+        known = {r["id"] for r in conn.execute("SELECT id FROM artifacts")}
+        orphans = [f for f in on_disk if f not in known]
+        for name in orphans:
+            try:
+                os.remove(artifact_path(name))
+            except OSError:
+                pass
+    finally:
+        conn.close()
+    if expired or evicted or orphans:
+        print(f"[INFO] Artifact sweep: {len(expired)} expired, {len(evicted)} evicted, {len(orphans)} orphaned")
+    return {"expired": len(expired), "evicted": len(evicted), "orphaned": len(orphans)}
+
+def start_artifact_sweeper(interval=SWEEP_INTERVAL_SECONDS):
+    def loop():
+        while True:
+            try:
+                sweep()
+            except Exception as e:
+                print("[ERROR] Artifact sweep failed:", e)
+            time.sleep(interval)
+    threading.Thread(target=loop, daemon=True, name="artifact-sweeper").start()
+
+# ----------------- Download -----------------
+def send_artifact(artifact_id, as_attachment=True):
+    """Owner-checked download with Range / ETag / If-Modified-Since support."""
+    conn = get_conn()
+    row = conn.execute("SELECT * FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+    # user_id NULL marks shared content (deduplicated audiobooks), reachable only by its opaque id
+    owner_ok = row is not None and row["user_id"] in (None, current_user.id)
+    if not owner_ok or row["expires_at"] <= datetime.utcnow().isoformat():
+        conn.close()
+        abort(404)
+    with conn:
+        conn.execute("UPDATE artifacts SET last_access = ? WHERE id = ?", (datetime.utcnow().isoformat(), artifact_id))
+    conn.close()
+
+    path = artifact_path(artifact_id)
+    if not os.path.exists(path):
+        abort(404)
+    response = send_file(path, mimetype=row["mimetype"], as_attachment=as_attachment,
+                         download_name=row["download_name"], conditional=True, etag=True)
+    # Browsers may revalidate with ETag; shared caches must not store it
+    response.cache_control.private = True
+    return response
+
+@artifacts_bp.route("/artifacts/<artifact_id>")
+@login_required
+def download_artifact(artifact_id):
+    return send_artifact(artifact_id, as_attachment=False)
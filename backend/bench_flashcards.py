@@ -0,0 +1,93 @@
+"""Benchmark flashcard extraction on multi-megabyte inputs.
+
+Compares the single-pass engine in flashcard_generator.py with the
+original two-pass helpers, checks both produce the same flashcard, and
+times the batch path:
+
+    python bench_flashcards.py --mb 4 --batch 8
+"""
+import argparse
+import random
+import re
+import time
+from collections import Counter
+
+from flashcard_generator import generate_flashcard, generate_flashcards_batch
+
+# ----------------- Original implementation (baseline) -----------------
+def legacy_generate_topic(text):
+    sentences = re.split(r'(?<=[.!?]) +', text.strip())
+    first_sentence = sentences[0].strip() if sentences else "Flashcard Topic"
+
+    words = re.findall(r'\w+', text.lower())
+    stopwords = set(['the','and','of','in','to','a','is','for','on','with','as','by','this','that','it'])
+    keywords = [w for w in words if w not in stopwords and len(w) > 3]
+    top_keywords = [w for w,_ in Counter(keywords).most_common(2)]
+
+    topic = first_sentence
+    if top_keywords:
+        topic += ": " + ", ".join(top_keywords).title()
+    return topic
+
+def legacy_extract_main_points(text, max_points=10):
+    sentences = re.split(r'(?<=[.!?]) +', text)
+    sentences = [s.strip() for s in sentences if len(s.strip().split()) > 4]
+
+    words = re.findall(r'\w+', text.lower())
+    stopwords = set(['the','and','of','in','to','a','is','for','on','with','as','by','this','that','it'])
+    keywords = [w for w in words if w not in stopwords]
+
+    word_freq = Counter(keywords)
+
+    scored_sentences = []
+    for s in sentences:
+        s_words = re.findall(r'\w+', s.lower())
+        score = sum(word_freq.get(w, 0) for w in s_words)
+        scored_sentences.append((score, s))
+
+    top_sentences = [s for _, s in sorted(scored_sentences, reverse=True)[:max_points]]
+
+    concise_points = []
+    for s in top_sentences:
+        words = s.split()
+        if len(words) > 15:
+            s = ' '.join(words[:15]) + '...'
+        concise_points.append(s)
+
+    return concise_points
+
+# ----------------- Input -----------------
+def make_text(size_bytes, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(3000)] + ["the", "and", "of", "in", "to", "a", "is", "for"]
+    out, size = [], 0
+    while size < size_bytes:
+        sentence = " ".join(rng.choice(vocab) for _ in range(rng.randint(3, 25))).capitalize() + rng.choice(".!?")
+        out.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(out)
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=4, help="Size of each input in MB")
+    parser.add_argument("--batch", type=int, default=8, help="Number of documents for the batch run")
+    args = parser.parse_args()
+
+    text = make_text(int(args.mb * 1024 * 1024))
+    old, t_old = timed(lambda t: {"topic": legacy_generate_topic(t), "points": legacy_extract_main_points(t)}, text)
+    new, t_new = timed(generate_flashcard, text)
+    assert old == new, "single-pass engine output differs from the original"
+    print(f"single {args.mb:g} MB: legacy {t_old:.2f}s, engine {t_new:.2f}s ({t_old / t_new:.1f}x)")
+
+    texts = [make_text(int(args.mb * 1024 * 1024), seed=i) for i in range(args.batch)]
+    _, t_seq = timed(lambda ts: [generate_flashcard(t) for t in ts], texts)
+    _, t_pool = timed(generate_flashcards_batch, texts)
+    print(f"batch of {args.batch}: sequential {t_seq:.2f}s, process pool {t_pool:.2f}s")
+
+if __name__ == "__main__":
+    main()
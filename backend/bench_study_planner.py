@@ -0,0 +1,145 @@
+"""Benchmark and cross-check the study plan scheduler.
+
+Runs the original per-day loop from study_planner.py against
+plan_scheduler.build_plan on random inputs and checks they agree, then
+times both on long deadline horizons:
+
+    python bench_study_planner.py --cases 2000 --years 1 5 --cohort 5000
+
+The original loop can spin forever (sub-minute remainders, knowledge
+levels not matching subjects, breaks that no longer fit), so the
+comparison feeds it whole-minute allocations and a step limit; the new
+engine drops fractional minutes and zero-length breaks by design.
+"""
+import argparse
+import datetime
+import random
+import time
+
+from plan_scheduler import WEIGHT_MAP, allocate_minutes, allocate_minutes_batch, build_plan, plan_days
+
+class Spinning(Exception):
+    pass
+
+# ----------------- Original implementation (baseline) -----------------
+def legacy_plan(subjects, time_per_subject, start_hour, end_hour, break_mins, mode, days, max_steps=100_000):
+    steps = 0
+    plan = []
+    for day in days:
+        current_time = start_hour * 60
+        day_tasks = []
+        remaining = time_per_subject.copy()
+
+        while any(r > 0 for r in remaining) and current_time < end_hour * 60:
+            steps += 1
+            if steps > max_steps:
+                raise Spinning()
+            for i, subj in enumerate(subjects):
+                if remaining[i] <= 0 or current_time >= end_hour * 60:
+                    continue
+                study_block = min(50, int(remaining[i]), end_hour*60 - current_time)
+                end_time = current_time + study_block
+                day_tasks.append({
+                    "time": f"{current_time//60:02d}:{current_time%60:02d} - {end_time//60:02d}:{end_time%60:02d}",
+                    "subject": subj
+                })
+                current_time = end_time
+                remaining[i] -= study_block
+
+                # Break
+                if current_time + break_mins <= end_hour*60:
+                    day_tasks.append({
+                        "time": f"{current_time//60:02d}:{current_time%60:02d} - {(current_time + break_mins)//60:02d}:{(current_time + break_mins)%60:02d}",
+                        "subject": "Break"
+                    })
+                    current_time += break_mins
+
+        # Deadline review
+        if mode.lower() == "deadline" and day == days[-1] and current_time < end_hour*60:
+            day_tasks.append({
+                "time": f"{current_time//60:02d}:{current_time%60:02d} - {end_hour:02d}:00",
+                "subject": "Deadline Review"
+            })
+
+        plan.append({"date": day.strftime('%A, %d-%m-%Y'), "tasks": day_tasks})
+    return plan
+
+def drop_zero_length(plan):
+    return [{"date": d["date"], "tasks": [t for t in d["tasks"] if t["time"][:5] != t["time"][-5:]]} for d in plan]
+
+# ----------------- Random cases -----------------
+def random_case(rng, today):
+    n = rng.randint(0, 6)
+    subjects = [f"Subject {i}" for i in range(n)]
+    knowledge = [rng.choice(list(WEIGHT_MAP) + ["unknown"]) for _ in range(n)]
+    start = rng.randint(0, 22)
+    mode = rng.choice(["Weekly", "Deadline", "Daily"])
+    deadline = (today + datetime.timedelta(days=rng.randint(-3, 40))).isoformat()
+    return {
+        "subjects": subjects,
+        "knowledge_levels": knowledge,
+        "available_hours": rng.choice([0, 0.5, 1, 2.5, 3, 4.75, 8, 12]),
+        "start_hour": start,
+        "end_hour": rng.randint(start - 2, 24),
+        "break_mins": rng.choice([0, 5, 10, 15, 30]),
+        "mode": mode,
+        "deadline": deadline,
+    }
+
+def check(cases, seed=0):
+    rng = random.Random(seed)
+    today = datetime.date(2025, 1, 15)
+    for _ in range(cases):
+        case = random_case(rng, today)
+        days = plan_days(case["mode"], case["deadline"], today)
+        new = build_plan(case["subjects"], case["knowledge_levels"], case["available_hours"],
+                         case["start_hour"], case["end_hour"], case["break_mins"], days)
+        minutes = allocate_minutes(case["subjects"], case["knowledge_levels"], case["available_hours"])
+        old = legacy_plan(case["subjects"], minutes, case["start_hour"], case["end_hour"],
+                          case["break_mins"], case["mode"], days[0])
+        assert new == drop_zero_length(old), f"scheduler output differs from the original for {case}"
+
+        # Properties that hold for every plan
+        for day in new:
+            for task in day["tasks"]:
+                start, end = task["time"].split(" - ")
+                assert start < end or task["subject"] == "Deadline Review", task
+
+# ----------------- Timing -----------------
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=2000, help="Random cases to cross-check")
+    parser.add_argument("--years", type=float, nargs="+", default=[1, 5], help="Deadline horizons to time")
+    parser.add_argument("--cohort", type=int, default=5000, help="Students for the batch allocation run")
+    args = parser.parse_args()
+
+    check(args.cases)
+    print(f"{args.cases} random cases match the original scheduler")
+
+    subjects = ["Maths", "Physics", "Chemistry", "Biology", "History"]
+    knowledge = ["beginner", "intermediate", "advanced", "beginner", "intermediate"]
+    today = datetime.date.today()
+    for years in args.years:
+        deadline = (today + datetime.timedelta(days=int(365 * years))).isoformat()
+        days = plan_days("Deadline", deadline, today)
+        minutes = allocate_minutes(subjects, knowledge, 6)
+        old, t_old = timed(legacy_plan, subjects, minutes, 8, 22, 10, "Deadline", days[0])
+        new, t_new = timed(build_plan, subjects, knowledge, 6, 8, 22, 10, days)
+        print(f"{years:g} years ({len(new)} days): legacy {t_old * 1000:.1f} ms, engine {t_new * 1000:.1f} ms "
+              f"({t_old / t_new:.0f}x)")
+
+    rng = random.Random(1)
+    cohort = [random_case(rng, today) for _ in range(args.cohort)]
+    columns = [[c[k] for c in cohort] for k in ("subjects", "knowledge_levels", "available_hours")]
+    one_by_one, t_loop = timed(lambda: [allocate_minutes(*c) for c in zip(*columns)])
+    batch, t_batch = timed(allocate_minutes_batch, *columns)
+    assert batch == one_by_one, "batch allocation differs from allocate_minutes"
+    print(f"cohort of {args.cohort}: per-student {t_loop * 1000:.1f} ms, NumPy batch {t_batch * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
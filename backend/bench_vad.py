@@ -0,0 +1,70 @@
+"""Check and time the voice activity detection in video_summarizer.py.
+
+Runs detect_speech / remove_silence on synthetic recordings and checks
+what they keep: tone bursts with pauses lose the pauses, while steady
+noise under a tone and speech-level audio with no pauses at all keep
+(nearly) everything instead of being dropped as silence:
+
+    python bench_vad.py --minutes 60
+"""
+import argparse
+import time
+
+import numpy as np
+
+from video_summarizer import SAMPLE_RATE, detect_speech, remove_silence
+
+def tone(seconds, amplitude=0.1, hz=220):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * hz * t)).astype(np.float32)
+
+def noise(rng, seconds, std):
+    return rng.normal(0, std, int(seconds * SAMPLE_RATE)).astype(np.float32)
+
+def kept_fraction(audio):
+    speech, _, _ = remove_silence(audio)
+    return len(speech) / len(audio)
+
+def check(seed=0):
+    rng = np.random.default_rng(seed)
+
+    # Speech with long pauses: the pauses go
+    pauses = np.concatenate([np.concatenate([tone(3), np.zeros(4 * SAMPLE_RATE, np.float32)]) for _ in range(5)])
+    pauses += noise(rng, len(pauses) / SAMPLE_RATE, 0.001)
+    kept = kept_fraction(pauses)
+    assert 0.35 < kept < 0.6, f"pauses: kept {kept:.2f}"
+
+    # Steady noise under a tone: the noise floor is speech level, keep it all
+    steady = tone(30) + noise(rng, 30, 0.03)
+    spans = detect_speech(steady)
+    assert sum(e - s for s, e in spans) > 0.9 * len(steady), f"steady noise: spans {spans[:3]}"
+
+    # Speech that never pauses
+    continuous = tone(30, hz=180) * (1 + 0.3 * np.sin(np.linspace(0, 60, 30 * SAMPLE_RATE))).astype(np.float32)
+    kept = kept_fraction(continuous)
+    assert kept > 0.9, f"continuous: kept {kept:.2f}"
+
+    # Near-silent recording: below VAD_MIN_KEEP, so the whole file goes to Whisper
+    quiet = noise(rng, 30, 0.001)
+    quiet[:SAMPLE_RATE // 2] += tone(0.5)
+    assert kept_fraction(quiet) == 1.0, "near-silent recording was cut"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=60, help="Length of the recording to time")
+    args = parser.parse_args()
+
+    check()
+    print("VAD checks passed")
+
+    rng = np.random.default_rng(1)
+    block = np.concatenate([tone(20) + noise(rng, 20, 0.005), noise(rng, 10, 0.002)])
+    audio = np.tile(block, int(args.minutes * 2))
+    t0 = time.perf_counter()
+    speech, _, stats = remove_silence(audio)
+    elapsed = time.perf_counter() - t0
+    print(f"{stats['total_seconds'] / 60:.0f} min: kept {stats['speech_seconds']:.0f}s, "
+          f"skipped {stats['skipped_seconds']:.0f}s in {elapsed * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,185 @@
+"""Admin CLI for inspecting and exporting the SQLite database.
+
+Every command uses cheap, index-friendly queries so it stays fast on
+production-sized tables:
+
+    python check_db.py summary
+    python check_db.py head tool_usage -n 20
+    python check_db.py tail login_activity --user 42
+    python check_db.py export tool_usage -o usage.jsonl.gz --since 2024-01-01
+"""
+import argparse
+import csv
+import gzip
+import json
 import sqlite3
-import pandas as pd
+import sys
+
+DB_PATH = "users.db"
+CHUNK_SIZE = 5000
+TIME_COLUMNS = ("ts", "created_at")
+
+# ----------------- Helpers -----------------
+def connect(db_path):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def list_tables(conn):
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ).fetchall()
+    return [r["name"] for r in rows]
+
+def table_columns(conn, table):
+    if table not in list_tables(conn):
+        raise SystemExit(f"Unknown table: {table}")
+    return [r["name"] for r in conn.execute(f'PRAGMA table_info("{table}")')]
+
+def build_filter(columns, user=None, since=None, until=None):
+    """WHERE clause pieces for the optional user / time window filters."""
+    clauses, params = [], []
+    if user is not None:
+        if "user_id" not in columns:
+            raise SystemExit("This table has no user_id column")
+        clauses.append("user_id = ?")
+        params.append(user)
+    if since or until:
+        time_col = next((c for c in TIME_COLUMNS if c in columns), None)
+        if time_col is None:
+            raise SystemExit("This table has no timestamp column")
+        if since:
+            clauses.append(f"{time_col} >= ?")
+            params.append(since)
+        if until:
+            clauses.append(f"{time_col} < ?")
+            params.append(until)
+    return clauses, params
+
+def iter_rows(conn, table, clauses, params, chunk_size=CHUNK_SIZE):
+    """Keyset scan over rowid; memory stays at one chunk regardless of table size."""
+    last = None
+    while True:
+        where = list(clauses)
+        args = list(params)
+        if last is not None:
+            where.append("rowid > ?")
+            args.append(last)
+        sql = f'SELECT rowid AS _rowid, * FROM "{table}"'
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY rowid LIMIT ?"
+        rows = conn.execute(sql, args + [chunk_size]).fetchall()
+        if not rows:
+            return
+        for r in rows:
+            yield r
+        last = rows[-1]["_rowid"]
+
+def row_dict(row):
+    d = dict(row)
+    d.pop("_rowid", None)
+    return d
 
-# Connect to your SQLite database
-conn = sqlite3.connect('users.db')
+def print_rows(rows):
+    if not rows:
+        print("Table is empty.")
+        return
+    for r in rows:
+        print(json.dumps(row_dict(r), default=str))
 
-# Get all table names
-tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type='table';", conn)
-print("Tables in database:", tables['name'].tolist())
+# ----------------- Commands -----------------
+def cmd_summary(conn, args):
+    for table in list_tables(conn):
+        count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        print(f"{table}: {count} rows")
+        for idx in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+            cols = [c["name"] for c in conn.execute(f'PRAGMA index_info("{idx["name"]}")')]
+            print(f"    index {idx['name']} ({', '.join(map(str, cols))})")
+        if args.explain and "user_id" in table_columns(conn, table):
+            plan = conn.execute(f'EXPLAIN QUERY PLAN SELECT * FROM "{table}" WHERE user_id = ?', (0,))
+            for step in plan:
+                print(f"    plan: {step['detail']}")
 
-# Function to display table neatly
-def show_table(table_name):
-    print(f"\nData in table: {table_name}")
+def cmd_head(conn, args):
+    clauses, params = build_filter(table_columns(conn, args.table), args.user, args.since, args.until)
+    rows = []
+    for r in iter_rows(conn, args.table, clauses, params, chunk_size=args.n):
+        rows.append(r)
+        if len(rows) >= args.n:
+            break
+    print_rows(rows)
+
+def cmd_tail(conn, args):
+    clauses, params = build_filter(table_columns(conn, args.table), args.user, args.since, args.until)
+    sql = f'SELECT rowid AS _rowid, * FROM "{args.table}"'
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY rowid DESC LIMIT ?"
+    rows = conn.execute(sql, params + [args.n]).fetchall()
+    print_rows(rows[::-1])
+
+def cmd_export(conn, args):
+    columns = table_columns(conn, args.table)
+    clauses, params = build_filter(columns, args.user, args.since, args.until)
+    fmt = args.format or ("csv" if ".csv" in args.output else "jsonl")
+    compress = args.gzip or args.output.endswith(".gz")
+
+    if args.output == "-":
+        out = sys.stdout
+    elif compress:
+        out = gzip.open(args.output, "wt", encoding="utf-8", newline="")
+    else:
+        out = open(args.output, "w", encoding="utf-8", newline="")
+
+    written = 0
     try:
-        df = pd.read_sql(f"SELECT * FROM {table_name}", conn)
-        if df.empty:
-            print("Table is empty.")
+        writer = csv.writer(out) if fmt == "csv" else None
+        if writer:
+            writer.writerow(columns)
+        for r in iter_rows(conn, args.table, clauses, params, chunk_size=args.chunk_size):
+            d = row_dict(r)
+            if writer:
+                writer.writerow([d[c] for c in columns])
+            else:
+                out.write(json.dumps(d, default=str) + "\n")
+            written += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"[INFO] Exported {written} rows from {args.table}", file=sys.stderr)
+
+# ----------------- CLI -----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and export the app database.")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database file (default: users.db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("summary", help="Row counts and indexes per table")
+    p.add_argument("--explain", action="store_true", help="Show the query plan for a per-user lookup")
+    p.set_defaults(func=cmd_summary)
+
+    for name, func in (("head", cmd_head), ("tail", cmd_tail), ("export", cmd_export)):
+        p = sub.add_parser(name)
+        p.add_argument("table")
+        p.add_argument("--user", type=int, help="Only rows for this user_id")
+        p.add_argument("--since", help="Only rows with timestamp >= this ISO date")
+        p.add_argument("--until", help="Only rows with timestamp < this ISO date")
+        if name == "export":
+            p.add_argument("-o", "--output", default="-", help="Output file, or - for stdout")
+            p.add_argument("--format", choices=("csv", "jsonl"))
+            p.add_argument("--gzip", action="store_true")
+            p.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
         else:
-            print(df)
-    except Exception as e:
-        print("Error:", e)
+            p.add_argument("-n", type=int, default=10)
+        p.set_defaults(func=func)
 
-# Example: show all tables
-for table in tables['name']:
-    show_table(table)
+    args = parser.parse_args(argv)
+    conn = connect(args.db)
+    try:
+        args.func(conn, args)
+    finally:
+        conn.close()
 
-# Close the connection
-conn.close()
+if __name__ == "__main__":
+    main()
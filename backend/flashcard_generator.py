@@ -0,0 +1,86 @@
+import re
+import os
+import heapq
+import threading
+from collections import Counter
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_all_start_methods, get_context
+
+# Compiled once; the helpers below are called on whole chapters
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?]) +')
+WORD_RE = re.compile(r'\w+')
+STOPWORDS = frozenset(['the','and','of','in','to','a','is','for','on','with','as','by','this','that','it'])
+
+BATCH_WORKERS = int(os.environ.get("FLASHCARDS_WORKERS", os.cpu_count() or 1))
+_pool = None
+_pool_lock = threading.Lock()
+
+# ----------------- Tokenize once -----------------
+def analyze(text):
+    """Single tokenization shared by topic and point extraction."""
+    sentences = SENTENCE_SPLIT_RE.split(text)
+    sentence_tokens = [WORD_RE.findall(s.lower()) for s in sentences]
+    freq = Counter(chain.from_iterable(sentence_tokens))
+    for w in STOPWORDS:
+        freq.pop(w, None)
+    return sentences, sentence_tokens, freq
+
+# ----------------- Topic -----------------
+def topic_from(sentences, freq):
+    first_sentence = sentences[0].strip() if sentences else "Flashcard Topic"
+    top_keywords = heapq.nlargest(2, (w for w in freq if len(w) > 3), key=freq.__getitem__)
+    topic = first_sentence
+    if top_keywords:
+        topic += ": " + ", ".join(top_keywords).title()
+    return topic
+
+# ----------------- Main points -----------------
+def points_from(sentences, sentence_tokens, freq, max_points=10):
+    scored = []
+    for s, tokens in zip(sentences, sentence_tokens):
+        s = s.strip()
+        if len(s.split()) <= 4:
+            continue
+        scored.append((sum(freq.get(w, 0) for w in tokens), s))
+
+    concise_points = []
+    for _, s in heapq.nlargest(max_points, scored):
+        words = s.split()
+        if len(words) > 15:
+            s = ' '.join(words[:15]) + '...'
+        concise_points.append(s)
+    return concise_points
+
+def generate_flashcard(text, max_points=10):
+    """Topic and main points from one shared tokenization."""
+    sentences, sentence_tokens, freq = analyze(text.strip())
+    return {
+        "topic": topic_from(sentences, freq),
+        "points": points_from(sentences, sentence_tokens, freq, max_points),
+    }
+
+def generate_topic(text):
+    sentences, _, freq = analyze(text.strip())
+    return topic_from(sentences, freq)
+
+def extract_main_points(text, max_points=10):
+    sentences, sentence_tokens, freq = analyze(text)
+    return points_from(sentences, sentence_tokens, freq, max_points)
+
+# ----------------- Batch -----------------
+def _get_pool():
+    # Not forked from the threaded server process (torch loaded, background threads running):
+    # workers come from a forkserver (spawn where there is none) and import only this module
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=get_context(method))
+        return _pool
+
+def generate_flashcards_batch(texts, max_points=10, min_parallel_chars=200_000):
+    """Generate one flashcard per text; large batches are spread over a process pool."""
+    if len(texts) < 2 or sum(len(t) for t in texts) < min_parallel_chars:
+        return [generate_flashcard(t, max_points) for t in texts]
+    return list(_get_pool().map(generate_flashcard, texts, [max_points] * len(texts), chunksize=1))
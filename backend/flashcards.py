@@ -1,60 +1,15 @@
 from flask import Blueprint, render_template, request, jsonify
 import sqlite3
 import re
-from collections import Counter
-from datetime import datetime
+import html
+from datetime import datetime, timedelta
 from flask_login import current_user, login_required
+from flashcard_generator import generate_flashcard, generate_flashcards_batch
+import admission
 
 flashcards_bp = Blueprint("flashcards", __name__)
 DB_PATH = "users.db"  # Make sure this matches your database file
 
-# ------------------------
-# Helper: Generate Topic
-# ------------------------
-def generate_topic(text):
-    sentences = re.split(r'(?<=[.!?]) +', text.strip())
-    first_sentence = sentences[0].strip() if sentences else "Flashcard Topic"
-
-    words = re.findall(r'\w+', text.lower())
-    stopwords = set(['the','and','of','in','to','a','is','for','on','with','as','by','this','that','it'])
-    keywords = [w for w in words if w not in stopwords and len(w) > 3]
-    top_keywords = [w for w,_ in Counter(keywords).most_common(2)]
-
-    topic = first_sentence
-    if top_keywords:
-        topic += ": " + ", ".join(top_keywords).title()
-    return topic
-
-# ------------------------
-# Helper: Extract Main Points
-# ------------------------
-def extract_main_points(text, max_points=10):
-    sentences = re.split(r'(?<=[.!?]) +', text)
-    sentences = [s.strip() for s in sentences if len(s.strip().split()) > 4]
-
-    words = re.findall(r'\w+', text.lower())
-    stopwords = set(['the','and','of','in','to','a','is','for','on','with','as','by','this','that','it'])
-    keywords = [w for w in words if w not in stopwords]
-
-    word_freq = Counter(keywords)
-
-    scored_sentences = []
-    for s in sentences:
-        s_words = re.findall(r'\w+', s.lower())
-        score = sum(word_freq.get(w, 0) for w in s_words)
-        scored_sentences.append((score, s))
-
-    top_sentences = [s for _, s in sorted(scored_sentences, reverse=True)[:max_points]]
-
-    concise_points = []
-    for s in top_sentences:
-        words = s.split()
-        if len(words) > 15:
-            s = ' '.join(words[:15]) + '...'
-        concise_points.append(s)
-
-    return concise_points
-
 # ------------------------
 # Helper: Record Tool Usage
 # ------------------------
@@ -75,6 +30,209 @@ def record_tool_usage(user_id, tool_name):
     except Exception as e:
         print("[ERROR] Recording tool usage:", e)
 
+# ------------------------
+# Store
+# ------------------------
+def get_db():
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_flashcards_db(conn):
+    """Per-user cards, decks and one row per point. Migrates the old single-table layout."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS flashcards (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT,
+            points TEXT
+        )
+    """)
+    columns = [r[1] for r in cur.execute("PRAGMA table_info(flashcards)")]
+    for col, ddl in (("user_id", "INTEGER"), ("deck_id", "INTEGER"), ("created_at", "TEXT"),
+                     ("ease", "REAL NOT NULL DEFAULT 2.5"), ("interval_days", "REAL NOT NULL DEFAULT 0"),
+                     ("repetitions", "INTEGER NOT NULL DEFAULT 0"), ("due_at", "TEXT")):
+        if col not in columns:
+            cur.execute(f"ALTER TABLE flashcards ADD COLUMN {col} {ddl}")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS flashcard_decks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            UNIQUE(user_id, name)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS flashcard_points (
+            card_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (card_id, position)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_flashcards_user ON flashcards(user_id, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_flashcards_deck ON flashcards(user_id, deck_id, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_flashcards_due ON flashcards(user_id, due_at)")
+    # Cards saved before review scheduling existed are due immediately
+    cur.execute("UPDATE flashcards SET due_at = COALESCE(created_at, ?) WHERE due_at IS NULL AND user_id IS NOT NULL",
+                (datetime.utcnow().isoformat(),))
+
+    # Move newline-joined points blobs into flashcard_points
+    legacy = cur.execute("SELECT id, points FROM flashcards WHERE points IS NOT NULL AND points != ''").fetchall()
+    for fid, blob in legacy:
+        points = [p.strip() for p in blob.split("\n") if p.strip()]
+        cur.executemany("INSERT OR IGNORE INTO flashcard_points (card_id, position, text) VALUES (?, ?, ?)",
+                        [(fid, i, p) for i, p in enumerate(points)])
+        cur.execute("UPDATE flashcards SET points = '' WHERE id = ?", (fid,))
+    conn.commit()
+
+    try:
+        init_flashcards_search(cur)
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        print("[WARN] Flashcard search unavailable (SQLite built without FTS5?):", e)
+
+POINTS_CONCAT = "(SELECT group_concat(text, char(10)) FROM (SELECT text FROM flashcard_points WHERE card_id = {} ORDER BY position))"
+
+def init_flashcards_search(cur):
+    """FTS5 index over topics and points, kept in sync with triggers.
+
+    user_id is indexed too, so a search matches it inside the index rather
+    than filtering every user's hits afterwards.
+    """
+    exists = cur.execute("SELECT sql FROM sqlite_master WHERE name = 'flashcards_fts'").fetchone()
+    if exists and "UNINDEXED" in exists[0]:
+        # Built with an unindexed user_id: rebuild it below
+        cur.execute("DROP TABLE flashcards_fts")
+        exists = None
+    cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS flashcards_fts
+        USING fts5(topic, points, user_id, tokenize = 'porter unicode61')
+    """)
+    cur.executescript(f"""
+        CREATE TRIGGER IF NOT EXISTS flashcards_fts_ai AFTER INSERT ON flashcards WHEN NEW.user_id IS NOT NULL BEGIN
+            INSERT INTO flashcards_fts (rowid, topic, points, user_id) VALUES (NEW.id, NEW.topic, '', NEW.user_id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS flashcards_fts_au AFTER UPDATE OF topic ON flashcards BEGIN
+            UPDATE flashcards_fts SET topic = NEW.topic WHERE rowid = NEW.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS flashcards_fts_ad AFTER DELETE ON flashcards BEGIN
+            DELETE FROM flashcards_fts WHERE rowid = OLD.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS flashcard_points_fts_ai AFTER INSERT ON flashcard_points BEGIN
+            UPDATE flashcards_fts SET points = {POINTS_CONCAT.format("NEW.card_id")} WHERE rowid = NEW.card_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS flashcard_points_fts_ad AFTER DELETE ON flashcard_points BEGIN
+            UPDATE flashcards_fts SET points = COALESCE({POINTS_CONCAT.format("OLD.card_id")}, '') WHERE rowid = OLD.card_id;
+        END;
+    """)
+    if not exists:
+        cur.execute(f"""
+            INSERT INTO flashcards_fts (rowid, topic, points, user_id)
+            SELECT f.id, f.topic, COALESCE({POINTS_CONCAT.format("f.id")}, ''), f.user_id
+            FROM flashcards f WHERE f.user_id IS NOT NULL
+        """)
+
+def _deck_id(cur, user_id, deck):
+    """Resolve a deck name or id for this user, creating named decks on demand."""
+    if deck in (None, ""):
+        return None
+    if isinstance(deck, int) or str(deck).isdigit():
+        row = cur.execute("SELECT id FROM flashcard_decks WHERE id = ? AND user_id = ?", (int(deck), user_id)).fetchone()
+        if row:
+            return row[0]
+    cur.execute("INSERT OR IGNORE INTO flashcard_decks (user_id, name, created_at) VALUES (?, ?, ?)",
+                (user_id, str(deck), datetime.utcnow().isoformat()))
+    return cur.execute("SELECT id FROM flashcard_decks WHERE user_id = ? AND name = ?", (user_id, str(deck))).fetchone()[0]
+
+def insert_flashcards(conn, user_id, cards, deck=None):
+    """Insert many cards in a single transaction; returns the new ids."""
+    ids = []
+    now = datetime.utcnow().isoformat()
+    with conn:
+        cur = conn.cursor()
+        for card in cards:
+            deck_id = _deck_id(cur, user_id, card.get("deck") or deck)
+            cur.execute("INSERT INTO flashcards (user_id, deck_id, topic, points, created_at, due_at) VALUES (?, ?, ?, '', ?, ?)",
+                        (user_id, deck_id, card["topic"], now, now))
+            fid = cur.lastrowid
+            cur.executemany("INSERT INTO flashcard_points (card_id, position, text) VALUES (?, ?, ?)",
+                            [(fid, i, p) for i, p in enumerate(card["points"])])
+            ids.append(fid)
+    return ids
+
+def load_points(cur, ids):
+    """Points for a page of cards in one query: {card_id: [point, ...]}."""
+    points = {}
+    if ids:
+        marks = ",".join("?" * len(ids))
+        for card_id, text in cur.execute(
+                f"SELECT card_id, text FROM flashcard_points WHERE card_id IN ({marks}) ORDER BY card_id, position", ids):
+            points.setdefault(card_id, []).append(text)
+    return points
+
+def delete_flashcards(conn, user_id, ids):
+    """Delete the user's cards (and their points) in one transaction; returns the count."""
+    with conn:
+        cur = conn.cursor()
+        owned = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            owned += [r[0] for r in cur.execute(
+                f"SELECT id FROM flashcards WHERE user_id = ? AND id IN ({marks})", [user_id] + chunk)]
+        cur.executemany("DELETE FROM flashcard_points WHERE card_id = ?", [(fid,) for fid in owned])
+        cur.executemany("DELETE FROM flashcards WHERE id = ?", [(fid,) for fid in owned])
+    return len(owned)
+
+# ------------------------
+# Spaced repetition (SM-2)
+# ------------------------
+def sm2(ease, interval, repetitions, quality):
+    """One SM-2 step. quality is 0-5; below 3 resets the card. Returns (ease, interval_days, repetitions)."""
+    if quality < 3:
+        repetitions = 0
+        interval = 1
+    else:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = round(interval * ease, 2)
+        repetitions += 1
+    ease = max(1.3, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return ease, interval, repetitions
+
+def apply_reviews(conn, user_id, reviews, now=None):
+    """Apply many {"id", "quality"} reviews in one transaction; returns the updated card states."""
+    now = now or datetime.utcnow()
+    updated = []
+    with conn:
+        cur = conn.cursor()
+        for r in reviews:
+            row = cur.execute("SELECT id, ease, interval_days, repetitions FROM flashcards WHERE id = ? AND user_id = ?",
+                              (r["id"], user_id)).fetchone()
+            if row is None:
+                continue
+            ease, interval, reps = sm2(row["ease"], row["interval_days"], row["repetitions"], r["quality"])
+            due_at = (now + timedelta(days=interval)).isoformat()
+            cur.execute("UPDATE flashcards SET ease = ?, interval_days = ?, repetitions = ?, due_at = ? WHERE id = ?",
+                        (ease, interval, reps, due_at, row["id"]))
+            updated.append({"id": row["id"], "ease": round(ease, 2), "interval_days": interval,
+                            "repetitions": reps, "due_at": due_at})
+    return updated
+
+def _valid_cards(items):
+    cards = []
+    for c in items or []:
+        topic = (c.get("topic") or "").strip()
+        points = [p.strip() for p in c.get("points", []) if p and p.strip()]
+        if topic and points:
+            cards.append({"topic": topic, "points": points, "deck": c.get("deck")})
+    return cards
+
 # ------------------------
 # Routes
 # ------------------------
@@ -92,71 +250,237 @@ def generate_flashcards():
     if not text.strip():
         return jsonify({"flashcards": []})
 
-    topic = generate_topic(text)
-    main_points = extract_main_points(text, max_points=10)
+    with admission.slot("nltk", current_user.id):
+        flashcard = generate_flashcard(text, max_points=10)
+    return jsonify({"flashcards": [flashcard]})
+
+
+@flashcards_bp.route("/generate_flashcards_batch", methods=["POST"])
+@login_required
+def generate_flashcards_batch_route():
+    """Body: {"texts": ["...", "..."]}; returns one flashcard per non-empty text, in order."""
+    data = request.get_json() or {}
+    texts = [t for t in data.get("texts", []) if isinstance(t, str) and t.strip()]
+    if not texts:
+        return jsonify({"flashcards": []})
+    if len(texts) > 100:
+        return jsonify({"error": "At most 100 texts per batch"}), 400
 
-    return jsonify({"flashcards": [{"topic": topic, "points": main_points}]})
+    with admission.slot("nltk", current_user.id):
+        flashcards = generate_flashcards_batch(texts, max_points=10)
+    return jsonify({"flashcards": flashcards})
 
 
 @flashcards_bp.route("/save_flashcard", methods=["POST"])
 @login_required
 def save_flashcard():
     data = request.get_json()
-    topic = data.get("topic", "")
-    points = data.get("points", [])
+    cards = _valid_cards([data])
     user_id = current_user.id  # use logged-in user
 
-    if not topic or not points:
+    if not cards:
         return jsonify({"success": False, "msg": "Invalid flashcard"})
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS flashcards (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT,
-                points TEXT
-            )
-        """)
-        cur.execute("INSERT INTO flashcards (topic, points) VALUES (?, ?)", (topic, "\n".join(points)))
-        conn.commit()
+        conn = get_db()
+        ids = insert_flashcards(conn, user_id, cards)
         conn.close()
 
         # Record tool usage
         record_tool_usage(user_id, "Flashcards")
 
-        return jsonify({"success": True})
+        return jsonify({"success": True, "id": ids[0]})
     except Exception as e:
         print("[ERROR] Saving flashcard:", e)
         return jsonify({"success": False, "msg": "Server error"})
 
 
+@flashcards_bp.route("/save_flashcards", methods=["POST"])
+@login_required
+def save_flashcards():
+    data = request.get_json() or {}
+    cards = _valid_cards(data.get("flashcards"))
+    if not cards:
+        return jsonify({"success": False, "msg": "No valid flashcards"}), 400
+
+    try:
+        conn = get_db()
+        ids = insert_flashcards(conn, current_user.id, cards, deck=data.get("deck"))
+        conn.close()
+        record_tool_usage(current_user.id, "Flashcards")
+        return jsonify({"success": True, "ids": ids})
+    except Exception as e:
+        print("[ERROR] Saving flashcards:", e)
+        return jsonify({"success": False, "msg": "Server error"}), 500
+
+
 @flashcards_bp.route("/get_flashcards")
 @login_required
 def get_flashcards():
-    conn = sqlite3.connect(DB_PATH)
+    """Keyset-paginated listing: ?limit=50&after=<last id>&deck=<deck id>."""
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 200)
+    after = request.args.get("after", 0, type=int)
+    deck = request.args.get("deck", type=int)
+
+    sql = "SELECT id, deck_id, topic FROM flashcards WHERE user_id = ? AND id > ?"
+    params = [current_user.id, after]
+    if deck is not None:
+        sql += " AND deck_id = ?"
+        params.append(deck)
+    sql += " ORDER BY id LIMIT ?"
+    params.append(limit + 1)
+
+    conn = get_db()
     cur = conn.cursor()
-    cur.execute("SELECT id, topic, points FROM flashcards")
-    rows = cur.fetchall()
-    flashcards = []
-    for row in rows:
-        points_list = [p.strip() for p in row[2].split("\n") if p.strip()]
-        flashcards.append({
-            "id": row[0],
-            "topic": row[1],
-            "points": points_list
-        })
+    rows = cur.execute(sql, params).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    points = load_points(cur, [r["id"] for r in rows])
     conn.close()
-    return jsonify({"flashcards": flashcards})
+
+    flashcards = [{
+        "id": r["id"],
+        "deck_id": r["deck_id"],
+        "topic": r["topic"],
+        "points": points.get(r["id"], [])
+    } for r in rows]
+    return jsonify({
+        "flashcards": flashcards,
+        "next_cursor": rows[-1]["id"] if has_more else None
+    })
 
 
 @flashcards_bp.route("/delete_flashcard/<int:fid>", methods=["DELETE"])
 @login_required
 def delete_flashcard(fid):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
+    deleted = delete_flashcards(conn, current_user.id, [fid])
+    conn.close()
+    return jsonify({"success": bool(deleted)})
+
+
+@flashcards_bp.route("/delete_flashcards", methods=["POST"])
+@login_required
+def delete_flashcards_bulk():
+    data = request.get_json() or {}
+    ids = [int(i) for i in data.get("ids", []) if str(i).isdigit()]
+    conn = get_db()
+    deleted = delete_flashcards(conn, current_user.id, ids)
+    conn.close()
+    return jsonify({"success": True, "deleted": deleted})
+
+
+@flashcards_bp.route("/flashcards/decks", methods=["GET", "POST"])
+@login_required
+def flashcard_decks():
+    conn = get_db()
     cur = conn.cursor()
-    cur.execute("DELETE FROM flashcards WHERE id=?", (fid,))
-    conn.commit()
+    if request.method == "POST":
+        name = ((request.get_json() or {}).get("name") or "").strip()
+        if not name:
+            conn.close()
+            return jsonify({"success": False, "msg": "Deck name required"}), 400
+        with conn:
+            deck_id = _deck_id(cur, current_user.id, name)
+        conn.close()
+        return jsonify({"success": True, "id": deck_id})
+
+    rows = cur.execute("""
+        SELECT d.id, d.name, COUNT(f.id) AS cards
+        FROM flashcard_decks d LEFT JOIN flashcards f ON f.deck_id = d.id AND f.user_id = d.user_id
+        WHERE d.user_id = ? GROUP BY d.id ORDER BY d.name
+    """, (current_user.id,)).fetchall()
+    conn.close()
+    return jsonify({"decks": [dict(r) for r in rows]})
+
+
+@flashcards_bp.route("/flashcards/due")
+@login_required
+def due_flashcards():
+    """Next N due cards, read in due order straight off idx_flashcards_due."""
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+    now = datetime.utcnow().isoformat()
+    conn = get_db()
+    cur = conn.cursor()
+    rows = cur.execute("""
+        SELECT id, deck_id, topic, ease, interval_days, repetitions, due_at
+        FROM flashcards WHERE user_id = ? AND due_at <= ?
+        ORDER BY due_at LIMIT ?
+    """, (current_user.id, now, limit)).fetchall()
+
+    points = load_points(cur, [r["id"] for r in rows])
+    conn.close()
+
+    cards = [dict(r, points=points.get(r["id"], [])) for r in rows]
+    return jsonify({"flashcards": cards})
+
+
+@flashcards_bp.route("/flashcards/review", methods=["POST"])
+@login_required
+def review_flashcards():
+    """Body: {"reviews": [{"id": 1, "quality": 4}, ...]} with quality 0-5."""
+    data = request.get_json() or {}
+    reviews = []
+    for r in data.get("reviews", []):
+        try:
+            reviews.append({"id": int(r["id"]), "quality": min(max(int(r["quality"]), 0), 5)})
+        except (KeyError, TypeError, ValueError):
+            continue
+    if not reviews:
+        return jsonify({"success": False, "msg": "No valid reviews"}), 400
+
+    conn = get_db()
+    updated = apply_reviews(conn, current_user.id, reviews)
     conn.close()
-    return jsonify({"success": True})
+    return jsonify({"success": True, "updated": updated})
+
+
+def fts_query(q, user_id):
+    """Turn free text into an FTS5 query scoped to one user: every word must match, as a prefix."""
+    terms = re.findall(r"\w+", q.lower())
+    if not terms:
+        return ""
+    return f'user_id : "{int(user_id)}" AND {{topic points}} : (' + " ".join(f'"{t}"*' for t in terms) + ")"
+
+# highlight() / snippet() markers; the text is HTML-escaped before they become <mark> tags
+MARK_OPEN, MARK_CLOSE = "\x02", "\x03"
+
+def marked_html(text):
+    return html.escape(text or "").replace(MARK_OPEN, "<mark>").replace(MARK_CLOSE, "</mark>")
+
+
+@flashcards_bp.route("/flashcards/search")
+@login_required
+def search_flashcards():
+    """BM25-ranked search over the user's cards: ?q=photosynth&page=1&limit=20."""
+    query = fts_query(request.args.get("q", ""), current_user.id)
+    if not query:
+        return jsonify({"results": [], "page": 1})
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    page = max(request.args.get("page", 1, type=int), 1)
+
+    conn = get_db()
+    try:
+        rows = conn.execute("""
+            SELECT rowid AS id,
+                   highlight(flashcards_fts, 0, ?, ?) AS topic,
+                   snippet(flashcards_fts, 1, ?, ?, '…', 16) AS snippet,
+                   bm25(flashcards_fts, 2.0, 1.0, 0.0) AS score
+            FROM flashcards_fts
+            WHERE flashcards_fts MATCH ? AND user_id = ?
+            ORDER BY score
+            LIMIT ? OFFSET ?
+        """, (MARK_OPEN, MARK_CLOSE, MARK_OPEN, MARK_CLOSE, query, current_user.id,
+              limit + 1, (page - 1) * limit)).fetchall()
+    except sqlite3.OperationalError as e:
+        print("[ERROR] Flashcard search:", e)
+        return jsonify({"error": "Search unavailable"}), 503
+    finally:
+        conn.close()
+
+    return jsonify({
+        "results": [dict(r, topic=marked_html(r["topic"]), snippet=marked_html(r["snippet"])) for r in rows[:limit]],
+        "page": page,
+        "has_more": len(rows) > limit
+    })
@@ -0,0 +1,28 @@
+"""gunicorn settings for the preload-and-fork serving mode (see wsgi.py).
+
+    gunicorn wsgi:app
+
+Environment: BIND, WEB_WORKERS, WEB_THREADS, WEB_TIMEOUT, TORCH_THREADS
+(and PROGRESS_SSE, which changes how many threads are needed; see below).
+"""
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_WORKERS", 2))
+# Threaded workers. Progress pages poll by default, so a thread is held only for the
+# length of a request. With PROGRESS_SSE=1 every open progress page holds one thread for
+# up to SSE_MAX_SECONDS: raise WEB_THREADS to the expected concurrent viewers per worker
+# plus headroom for ordinary requests, or they starve everything else (even /login).
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", 8))
+timeout = int(os.environ.get("WEB_TIMEOUT", 120))
+
+# Load models and indexes in the master, then fork
+preload_app = True
+
+# Split the cores between workers unless TORCH_THREADS is set explicitly
+os.environ.setdefault("TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.init_worker()
@@ -1,39 +1,386 @@
 from flask import Blueprint, render_template, request, jsonify, current_app
+from flask_login import current_user, login_required
 import os
+import re
+import json
+import hashlib
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import wave
 import pyttsx3
 from pdfminer.high_level import extract_text
 import threading
+from werkzeug.utils import secure_filename
 from utils import record_tool_usage  # Use utils.py to handle DB logging
+import admission
+import progress
+from uploads import claim_upload, upload_limit
+from datetime import datetime, timedelta
+from artifacts import reserve_artifact, finalize_artifact, artifact_url, artifact_path, delete_artifacts, ARTIFACT_TTL_HOURS
 
 pdf_bp = Blueprint("pdf_bp", __name__)
 
-# Track progress per user
-pdf_progress = {}
+# CONFIG
+# Conversions run on the "tts" admission gate (TTS_WORKERS at a time, TTS_QUEUE_SIZE queued; see admission.py)
+TTS_CHUNK_CHARS = int(os.environ.get("TTS_CHUNK_CHARS", 1500))
+FFMPEG_PATH = os.environ.get("FFMPEG_PATH") or shutil.which("ffmpeg")
+# pyttsx3 writes WAV (espeak, SAPI5) or AIFF (NSSpeechSynthesizer on macOS), whatever the file is called
+SEGMENT_FORMAT = ("aiff", "audio/aiff") if sys.platform == "darwin" else ("wav", "audio/wav")
+# The full download is re-encoded to MP3 when ffmpeg is available, else the WAV segments are joined as WAV
+AUDIO_FORMAT = ("mp3", "audio/mpeg") if FFMPEG_PATH else SEGMENT_FORMAT
 
-def convert_pdf_to_audio(pdf_path, user_id, audio_path):
-    """Process PDF to audio in a background thread"""
+# Voice settings are part of the audiobook content hash
+TTS_VOICE = os.environ.get("TTS_VOICE", "")
+TTS_RATE = int(os.environ.get("TTS_RATE", 0))
+
+# Shared audiobooks live until their last reference expires (refs last ARTIFACT_TTL_HOURS)
+DB_PATH = "users.db"
+SHARED_AUDIO_TTL_HOURS = 24 * 365 * 10
+AUDIOBOOK_SWEEP_SECONDS = 900
+
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+PARAGRAPH_RE = re.compile(r'\n\s*\n')
+
+# Job state lives on the progress bus: {"state", "stage", "progress", "audio_url", "segments", ...}
+# Cancel flags by job id; only workers and the cancel route touch them
+_cancel_events = {}
+_jobs_lock = threading.Lock()
+_engines = threading.local()
+
+class JobCancelled(Exception):
+    pass
+
+def _check_cancel(job):
+    # Cancel requests for this process's jobs can arrive through another worker
+    if job["cancel"].is_set() or progress.cancel_requested(job["id"]):
+        raise JobCancelled()
+
+# ------------------------
+# Audiobook index (dedup by content hash)
+# ------------------------
+def get_conn():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_audiobooks_db(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS audiobooks (
+            content_hash TEXT PRIMARY KEY,
+            audio_id TEXT NOT NULL,
+            segment_ids TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            last_used TEXT NOT NULL
+        )
+    ''')
+    # Fast path: identical PDF bytes (under the same voice settings, see source_hash) map straight
+    # to the content hash, no text extraction needed
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS audiobook_sources (
+            pdf_hash TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL
+        )
+    ''')
+    # One reference per user holding the audiobook; it is evicted once none are left
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS audiobook_refs (
+            content_hash TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            expires_at TEXT NOT NULL,
+            PRIMARY KEY (content_hash, user_id)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audiobook_refs_expires ON audiobook_refs(expires_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audiobook_sources_content ON audiobook_sources(content_hash)")
+    conn.commit()
+
+def _settings_fingerprint():
+    return f"voice={TTS_VOICE};rate={TTS_RATE}\n".encode()
+
+def content_hash(text):
+    h = hashlib.sha256(_settings_fingerprint())
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+def source_hash(pdf_hash):
+    """audiobook_sources key: the PDF's hash under the current voice settings."""
+    return hashlib.sha256(_settings_fingerprint() + pdf_hash.encode()).hexdigest()
+
+def file_hash(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def find_audiobook(conn, chash=None, pdf_hash=None):
+    """Existing audiobook for a content hash (or PDF hash) whose files are still on disk."""
+    if chash is None and pdf_hash is not None:
+        row = conn.execute("SELECT content_hash FROM audiobook_sources WHERE pdf_hash = ?",
+                           (source_hash(pdf_hash),)).fetchone()
+        chash = row["content_hash"] if row else None
+    if chash is None:
+        return None
+    row = conn.execute("SELECT * FROM audiobooks WHERE content_hash = ?", (chash,)).fetchone()
+    if row is None:
+        return None
+    segment_ids = json.loads(row["segment_ids"])
+    if not all(os.path.exists(artifact_path(a)) for a in [row["audio_id"]] + segment_ids):
+        # Files were evicted by the artifact store; forget the entry and synthesize again
+        with conn:
+            conn.execute("DELETE FROM audiobooks WHERE content_hash = ?", (chash,))
+        return None
+    return {"content_hash": chash, "audio_id": row["audio_id"], "segment_ids": segment_ids}
+
+def add_reference(conn, chash, user_id, pdf_hash=None):
+    now = datetime.utcnow()
+    expires = (now + timedelta(hours=ARTIFACT_TTL_HOURS)).isoformat()
+    with conn:
+        conn.execute("""
+            INSERT INTO audiobook_refs (content_hash, user_id, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(content_hash, user_id) DO UPDATE SET expires_at = excluded.expires_at
+        """, (chash, user_id, expires))
+        conn.execute("UPDATE audiobooks SET last_used = ? WHERE content_hash = ?", (now.isoformat(), chash))
+        if pdf_hash:
+            conn.execute("INSERT OR REPLACE INTO audiobook_sources (pdf_hash, content_hash) VALUES (?, ?)",
+                         (source_hash(pdf_hash), chash))
+
+def register_audiobook(conn, chash, audio_id, segment_ids):
+    """Store a new audiobook; False when a concurrent job registered the same content first."""
+    now = datetime.utcnow().isoformat()
+    with conn:
+        cur = conn.execute("""
+            INSERT INTO audiobooks (content_hash, audio_id, segment_ids, created_at, last_used)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(content_hash) DO NOTHING
+        """, (chash, audio_id, json.dumps(segment_ids), now, now))
+    return cur.rowcount == 1
+
+def sweep_audiobooks():
+    """Drop expired references, then delete audiobooks nobody references any more."""
+    conn = get_conn()
     try:
-        pdf_progress[user_id] = 0
+        with conn:
+            conn.execute("DELETE FROM audiobook_refs WHERE expires_at <= ?", (datetime.utcnow().isoformat(),))
+        unused = conn.execute("""
+            SELECT content_hash, audio_id, segment_ids FROM audiobooks a
+            WHERE NOT EXISTS (SELECT 1 FROM audiobook_refs r WHERE r.content_hash = a.content_hash)
+        """).fetchall()
+        for row in unused:
+            delete_artifacts(conn, [row["audio_id"]] + json.loads(row["segment_ids"]))
+            with conn:
+                conn.execute("DELETE FROM audiobooks WHERE content_hash = ?", (row["content_hash"],))
+                conn.execute("DELETE FROM audiobook_sources WHERE content_hash = ?", (row["content_hash"],))
+        if unused:
+            print(f"[INFO] Audiobook sweep removed {len(unused)} unreferenced audiobooks")
+        return len(unused)
+    finally:
+        conn.close()
 
-        # Extract text from PDF
-        text = extract_text(pdf_path)
-        pdf_progress[user_id] = 30
+def start_audiobook_sweeper(interval=AUDIOBOOK_SWEEP_SECONDS):
+    def loop():
+        while True:
+            try:
+                sweep_audiobooks()
+            except Exception as e:
+                print("[ERROR] Audiobook sweep failed:", e)
+            time.sleep(interval)
+    threading.Thread(target=loop, daemon=True, name="audiobook-sweeper").start()
 
-        # Convert text to audio
-        engine = pyttsx3.init()
-        engine.save_to_file(text, audio_path)
-        pdf_progress[user_id] = 70
-        engine.runAndWait()
-        pdf_progress[user_id] = 100  # Done
+# ------------------------
+# Synthesis
+# ------------------------
+def split_text(text, max_chars=TTS_CHUNK_CHARS):
+    """Paragraph-sized chunks of at most ~max_chars, split on sentence boundaries."""
+    chunks = []
+    current = ""
+    for para in PARAGRAPH_RE.split(text):
+        para = " ".join(para.split())
+        if not para:
+            continue
+        pieces = [para] if len(para) <= max_chars else SENTENCE_END_RE.split(para)
+        for piece in pieces:
+            if current and len(current) + len(piece) + 1 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current} {piece}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+def join_segments(paths, out_path):
+    """Join segment files into one download: ffmpeg re-encodes to MP3, else WAV frames are joined with wave."""
+    if FFMPEG_PATH:
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as lst:
+            lst.writelines(f"file '{p}'\n" for p in paths)
+        try:
+            subprocess.run([FFMPEG_PATH, "-nostdin", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                            "-i", lst.name, "-c:a", "libmp3lame", "-q:a", "4", "-f", "mp3", out_path],
+                           check=True, capture_output=True)
+        finally:
+            os.remove(lst.name)
+        return
+    if SEGMENT_FORMAT[0] != "wav":
+        raise RuntimeError("ffmpeg is needed to join AIFF segments")
+    with wave.open(out_path, "wb") as out:
+        for i, p in enumerate(paths):
+            with wave.open(p, "rb") as seg:
+                if i == 0:
+                    out.setparams(seg.getparams())
+                elif seg.getparams()[:3] != out.getparams()[:3]:
+                    raise ValueError(f"Segment {p} has a different sample format")
+                out.writeframes(seg.readframes(seg.getnframes()))
 
-        print(f"[INFO] PDF converted for user {user_id}: {audio_path}")
+def _finish_from_audiobook(job, book):
+    """Mark a job done using an existing audiobook; no TTS runs."""
+    progress.publish(job["id"], state="done", stage="done", progress=100, deduplicated=True,
+                     audio_url=artifact_url(book["audio_id"]),
+                     segments=[artifact_url(a) for a in book["segment_ids"]],
+                     chunks_total=len(book["segment_ids"]), chunks_done=len(book["segment_ids"]))
+    record_tool_usage(job["user_id"], "PDF to Audio")
+
+def convert_pdf_to_audio(engine, job):
+    """Run one job on this worker's engine, one chunk at a time so playback can start early"""
+    job_id = job["id"]
+    conn = get_conn()
+    segment_ids, unregistered = [], []
+    try:
+        _check_cancel(job)
+        progress.publish(job_id, state="running", stage="extracting", progress=0, started_at=time.time())
+
+        # Extract text; identical text + voice settings reuses an existing audiobook
+        text = extract_text(job["pdf_path"])
+        chash = content_hash(text)
+        book = find_audiobook(conn, chash)
+        if book:
+            add_reference(conn, chash, job["user_id"], job["pdf_hash"])
+            _finish_from_audiobook(job, book)
+            print(f"[INFO] PDF job {job_id} reused audiobook {chash[:12]}")
+            return
+
+        chunks = split_text(text)
+        if not chunks:
+            raise ValueError("No text found in PDF")
+        if not FFMPEG_PATH and SEGMENT_FORMAT[0] != "wav":
+            raise RuntimeError("ffmpeg is needed to join AIFF segments")  # fail before synthesizing, not after
+        progress.publish(job_id, stage="synthesizing", chunks_total=len(chunks), chunks_done=0)
+
+        # Synthesize chunk by chunk; each finished segment is playable right away.
+        # Audiobook files are shared between users, so they have no owner.
+        segment_paths, segment_urls = [], []
+        for i, chunk in enumerate(chunks):
+            _check_cancel(job)
+            segment_id, segment_path = reserve_artifact(None, "pdf_audio_segment",
+                                                        f"part_{i + 1:04d}.{SEGMENT_FORMAT[0]}", SEGMENT_FORMAT[1],
+                                                        ttl_hours=SHARED_AUDIO_TTL_HOURS)
+            engine.save_to_file(chunk, segment_path)
+            engine.runAndWait()
+            finalize_artifact(segment_id)
+            segment_ids.append(segment_id)
+            unregistered.append(segment_id)
+            segment_paths.append(segment_path)
+            segment_urls.append(artifact_url(segment_id))
+            progress.publish(job_id, segments=list(segment_urls), chunks_done=i + 1,
+                             progress=int(99 * (i + 1) / len(chunks)))
+
+        # Full-length download
+        progress.publish(job_id, stage="joining")
+        audio_id, audio_path = reserve_artifact(None, "pdf_audio", job["audio_name"], AUDIO_FORMAT[1],
+                                                ttl_hours=SHARED_AUDIO_TTL_HOURS)
+        unregistered.append(audio_id)
+        join_segments(segment_paths, audio_path)
+        finalize_artifact(audio_id)
+        # Reference first so the sweeper never sees the new audiobook unreferenced
+        add_reference(conn, chash, job["user_id"], job["pdf_hash"])
+        if not register_audiobook(conn, chash, audio_id, segment_ids):
+            # Another job synthesized the same text meanwhile: serve its copy and drop ours,
+            # which no audiobook row lists, so the sweeper would never delete it
+            book = find_audiobook(conn, chash)
+            if book is not None:
+                delete_artifacts(conn, unregistered)
+                unregistered.clear()
+                _finish_from_audiobook(job, book)
+                print(f"[INFO] PDF job {job_id} lost the race for audiobook {chash[:12]}; reused the winner")
+                return
+            # The winner's files are already gone (find_audiobook dropped its row); keep ours
+            register_audiobook(conn, chash, audio_id, segment_ids)
+        unregistered.clear()
+        progress.publish(job_id, state="done", stage="done", progress=100, audio_url=artifact_url(audio_id))  # Done
+
+        print(f"[INFO] PDF converted for user {job['user_id']}: {audio_path} ({len(chunks)} chunks)")
 
         # Log usage via utils.py
-        record_tool_usage(user_id, "PDF to Audio")
+        record_tool_usage(job["user_id"], "PDF to Audio")
 
+    except JobCancelled:
+        # Partial output has the long shared TTL but no audiobook entry; drop it now
+        delete_artifacts(conn, unregistered)
+        progress.publish(job_id, state="cancelled", stage="cancelled")
+        print(f"[INFO] PDF job {job_id} cancelled")
     except Exception as e:
+        delete_artifacts(conn, unregistered)
         print(f"[ERROR] PDF processing failed: {e}")
-        pdf_progress[user_id] = -1  # Error
+        progress.fail(job_id, e)  # Error
+        raise
+    finally:
+        conn.close()
+        try:
+            os.remove(job["pdf_path"])
+        except OSError:
+            pass
+
+def _engine():
+    # pyttsx3 engines are not thread-safe: each gate thread owns one and reuses it for every job
+    engine = getattr(_engines, "engine", None)
+    if engine is None:
+        engine = pyttsx3.init()
+        if TTS_VOICE:
+            engine.setProperty("voice", TTS_VOICE)
+        if TTS_RATE:
+            engine.setProperty("rate", TTS_RATE)
+        _engines.engine = engine
+    return engine
+
+def _run_job(job):
+    try:
+        convert_pdf_to_audio(_engine(), job)
+    except Exception as e:
+        # Start the next job on a fresh engine
+        print("[WARN] TTS worker resetting engine:", e)
+        _engines.engine = None
+    finally:
+        with _jobs_lock:
+            _cancel_events.pop(job["id"], None)
+
+def _new_job(user_id, audio_name):
+    return progress.create_job(user_id, "PDF to Audio", audio_file=audio_name, audio_url=None,
+                               segments=[], chunks_total=None, chunks_done=0)
+
+def submit_job(user_id, pdf_path, pdf_hash, audio_name):
+    """Queue a job and return its id; raises admission.Overloaded when the "tts" gate can't take it."""
+    job_id = _new_job(user_id, audio_name)
+    job = {"id": job_id, "user_id": user_id, "pdf_path": pdf_path, "pdf_hash": pdf_hash,
+           "audio_name": audio_name, "cancel": threading.Event()}
+    with _jobs_lock:
+        _cancel_events[job_id] = job["cancel"]
+    try:
+        admission.submit("tts", user_id, _run_job, job)
+    except admission.Overloaded:
+        with _jobs_lock:
+            del _cancel_events[job_id]
+        progress.discard(job_id)
+        raise
+    return job_id
+
+def finished_job(user_id, audio_name, book):
+    """Job record for an upload served straight from an existing audiobook."""
+    job_id = _new_job(user_id, audio_name)
+    _finish_from_audiobook({"id": job_id, "user_id": user_id}, book)
+    return job_id
 
 # Routes
 @pdf_bp.route("/pdf_to_audio")
@@ -41,32 +388,93 @@ def pdf_to_audio_page():
     return render_template("pdf_to_audio.html")
 
 @pdf_bp.route("/pdf_to_audio_process", methods=["POST"])
+@login_required
+@upload_limit("pdf_to_audio")
 def pdf_to_audio_process():
-    pdf_file = request.files["pdf_file"]
-    user_id = request.form.get("user_id", "1")
+    # Turn away before reading the upload when the queue can't take it
+    admission.check("tts", current_user.id)
 
-    # Save uploaded PDF
+    # Save uploaded PDF (removed once converted)
     upload_folder = os.path.join(current_app.root_path, "uploads")
     os.makedirs(upload_folder, exist_ok=True)
-    pdf_path = os.path.join(upload_folder, pdf_file.filename)
-    pdf_file.save(pdf_path)
+    upload_id = request.form.get("upload_id")
+    if upload_id:
+        # Finished chunked upload: hashed while it arrived
+        upload = claim_upload(upload_id, current_user.id, "pdf_to_audio", upload_folder)
+        if upload is None:
+            return jsonify({"status": "error", "message": "Unknown or unfinished upload"}), 400
+        filename, pdf_path, pdf_hash = upload["filename"], upload["path"], upload["sha256"]
+    else:
+        pdf_file = request.files.get("pdf_file")
+        if pdf_file is None or not pdf_file.filename:
+            return jsonify({"status": "error", "message": "No PDF file uploaded"}), 400
+        filename = secure_filename(pdf_file.filename) or "document.pdf"
+        pdf_path = os.path.join(upload_folder, f"{os.urandom(8).hex()}_{filename}")
+        pdf_file.save(pdf_path)
+        pdf_hash = file_hash(pdf_path)
+    audio_name = f"{os.path.splitext(filename)[0]}.{AUDIO_FORMAT[0]}"
 
-    # Audio output path
-    audio_folder = os.path.join(current_app.root_path, "static", "audios")
-    os.makedirs(audio_folder, exist_ok=True)
-    audio_path = os.path.join(audio_folder, pdf_file.filename.replace(".pdf", ".mp3"))
+    # Same PDF converted before: answer immediately, no TTS
+    conn = get_conn()
+    try:
+        book = find_audiobook(conn, pdf_hash=pdf_hash)
+        if book:
+            add_reference(conn, book["content_hash"], current_user.id)
+    finally:
+        conn.close()
+    if book:
+        os.remove(pdf_path)
+        job_id = finished_job(current_user.id, audio_name, book)
+        return jsonify(dict(progress.job_urls(job_id),
+                            status="success",
+                            message="Audio already available",
+                            audio_file=audio_name,
+                            audio_url=artifact_url(book["audio_id"])))
 
-    # Start background thread (daemon=True so it won't block exit)
-    threading.Thread(target=convert_pdf_to_audio, args=(pdf_path, user_id, audio_path), daemon=True).start()
+    try:
+        job_id = submit_job(current_user.id, pdf_path, pdf_hash, audio_name)
+    except admission.Overloaded:
+        os.remove(pdf_path)
+        raise
 
-    return jsonify({
-        "status": "success",
-        "message": "PDF processing started",
-        "audio_file": os.path.basename(audio_path)
-    })
+    return jsonify(dict(progress.job_urls(job_id),
+                        status="success",
+                        message="PDF processing started",
+                        audio_file=audio_name,
+                        audio_url=None))
 
 @pdf_bp.route("/pdf_progress")
+@login_required
 def pdf_progress_status():
-    user_id = request.args.get("user_id", "1")
-    progress = pdf_progress.get(user_id, 0)
-    return jsonify({"progress": progress})
+    """Kept for old clients; /progress/<job_id> serves the same state."""
+    job = progress.owned_job(request.args.get("job_id", ""))
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@pdf_bp.route("/pdf_jobs/<job_id>/playlist.m3u")
+@login_required
+def pdf_job_playlist(job_id):
+    """Growing M3U playlist of the segments synthesized so far."""
+    job = progress.owned_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    lines = ["#EXTM3U"] + [request.host_url.rstrip("/") + url for url in job["segments"]]
+    return "\n".join(lines) + "\n", 200, {"Content-Type": "audio/x-mpegurl", "Cache-Control": "no-cache"}
+
+@pdf_bp.route("/pdf_jobs/<job_id>/cancel", methods=["POST"])
+@login_required
+def cancel_pdf_job(job_id):
+    job = progress.owned_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    with _jobs_lock:
+        cancel = _cancel_events.get(job_id)
+    if cancel is not None:
+        cancel.set()
+        if job["state"] == "queued":
+            progress.publish(job_id, state="cancelled", stage="cancelled")
+    else:
+        # Owned by another worker process: flagged (and, if still queued, marked cancelled) in SQLite
+        progress.request_cancel(job_id)
+    return jsonify({"status": "cancelling", "job_id": job_id})
@@ -0,0 +1,176 @@
+import datetime
+import numpy as np
+
+# Minutes of study per day are split between subjects by knowledge level
+WEIGHT_MAP = {'beginner': 1.5, 'intermediate': 1.0, 'advanced': 0.5}
+MAX_BLOCK_MINUTES = 50
+
+# ----------------- Inputs -----------------
+def parse_plan_request(data, today=None, days_cache=None):
+    """Normalize a /generate_plan payload into keyword arguments for build_plan.
+
+    days_cache (a dict) lets a batch of requests share date lists per mode/deadline.
+    """
+    subjects = [s.strip() for s in data.get('subjects', [])]
+    knowledge_levels = [k.strip().lower() for k in data.get('knowledge', [])]
+    try:
+        available_hours = float(data.get('available_hours', 3))
+    except (TypeError, ValueError):
+        available_hours = 3.0
+    preferred_hours = data.get('preferred_hours', '18:00-21:00')
+    breaks_pref = data.get('breaks', '10 mins after every hour')
+
+    # Parse preferred hours
+    try:
+        start_hour, end_hour = [int(h.split(':')[0]) for h in preferred_hours.split('-')]
+    except:
+        start_hour, end_hour = 18, 21
+
+    # Parse break duration
+    try:
+        break_mins = int(breaks_pref.split()[0])
+    except:
+        break_mins = 10
+
+    return {
+        "subjects": subjects,
+        "knowledge_levels": knowledge_levels,
+        "available_hours": available_hours,
+        "start_hour": start_hour,
+        "end_hour": end_hour,
+        "break_mins": break_mins,
+        "days": _days(data.get('mode', 'Weekly'), data.get('deadline', None), today, days_cache),
+    }
+
+def _days(mode, deadline_str, today, cache):
+    if cache is None:
+        return plan_days(mode, deadline_str, today)
+    key = (mode.lower(), deadline_str)
+    if key not in cache:
+        cache[key] = plan_days(mode, deadline_str, today)
+    return cache[key]
+
+def plan_days(mode, deadline_str=None, today=None):
+    """Dates covered by the plan, plus whether the last one ends with a deadline review."""
+    today = today or datetime.date.today()
+    if mode.lower() == "weekly":
+        monday = today - datetime.timedelta(days=today.weekday())
+        return [monday + datetime.timedelta(days=i) for i in range(7)], False
+    if mode.lower() == "deadline" and deadline_str:
+        try:
+            deadline = datetime.datetime.strptime(deadline_str, "%Y-%m-%d").date()
+        except ValueError:
+            deadline = today
+        return [today + datetime.timedelta(days=i) for i in range((deadline - today).days + 1)], True
+    return [today], False
+
+def allocate_minutes(subjects, knowledge_levels, available_hours):
+    """Whole study minutes per subject; a missing knowledge level counts as intermediate.
+
+    Fractions of a minute are dropped: they can never fill a block.
+    """
+    weights = [WEIGHT_MAP.get(k, 1.0) for k in knowledge_levels[:len(subjects)]]
+    weights += [1.0] * (len(subjects) - len(weights))
+    total_weight = sum(weights) or 1
+    return [int(available_hours * 60 * (w / total_weight)) for w in weights]
+
+def allocate_minutes_batch(subject_lists, knowledge_lists, hours):
+    """allocate_minutes for a whole cohort in one pass over padded NumPy arrays.
+
+    Students with fewer subjects are padded with zero weights. Returns one
+    list of whole minutes per student, identical to allocate_minutes.
+    """
+    counts = np.array([len(s) for s in subject_lists], dtype=np.int64)
+    n, width = len(counts), int(counts.max()) if len(counts) else 0
+    levels = list(WEIGHT_MAP)
+    level_weights = np.array([WEIGHT_MAP[k] for k in levels] + [1.0])  # last slot: unknown / missing
+    codes = {k: i for i, k in enumerate(levels)}
+    missing = len(levels)
+    flat = np.array([code for s, k in zip(subject_lists, knowledge_lists)
+                     for code in [codes.get(level, missing) for level in k[:len(s)]] + [missing] * (len(s) - len(k))],
+                    dtype=np.int64)
+
+    rows = np.repeat(np.arange(n), counts)
+    cols = np.arange(len(flat)) - np.repeat(np.cumsum(counts) - counts, counts)
+    weights = np.zeros((n, width))
+    weights[rows, cols] = level_weights[flat]
+    totals = weights.sum(axis=1)
+    totals[totals == 0] = 1
+    minutes = np.trunc(np.asarray(hours, dtype=float)[:, None] * 60 * (weights / totals[:, None])).astype(np.int64)
+    return [row[:c] for row, c in zip(minutes.tolist(), counts.tolist())]
+
+# ----------------- Engine -----------------
+def _fmt(minute):
+    return f"{minute//60:02d}:{minute%60:02d}"
+
+def day_template(subjects, minutes, start_hour, end_hour, break_mins):
+    """Tasks for one day and the minute the last one ends.
+
+    Subjects take turns in blocks of up to MAX_BLOCK_MINUTES, each followed by
+    a break if it still fits before end_hour. Every block is at least one
+    minute long, so the loop always terminates within the day window.
+    """
+    current, end = start_hour * 60, end_hour * 60
+    remaining = list(minutes)
+    active = [i for i, m in enumerate(remaining) if m > 0]
+    break_mins = max(break_mins, 0)
+    tasks = []
+    while active and current < end:
+        still_active = []
+        for i in active:
+            if current >= end:
+                break
+            block = min(MAX_BLOCK_MINUTES, remaining[i], end - current)
+            tasks.append({"time": f"{_fmt(current)} - {_fmt(current + block)}", "subject": subjects[i]})
+            current += block
+            remaining[i] -= block
+            if remaining[i] > 0:
+                still_active.append(i)
+
+            # Break
+            if break_mins and current + break_mins <= end:
+                tasks.append({"time": f"{_fmt(current)} - {_fmt(current + break_mins)}", "subject": "Break"})
+                current += break_mins
+        active = still_active
+    return tasks, current
+
+def build_plan(subjects, knowledge_levels, available_hours, start_hour, end_hour, break_mins, days, minutes=None):
+    """Plan for every day in days = (dates, deadline_review).
+
+    All days share one template, so the cost does not grow with the horizon
+    beyond emitting the dates. Task lists are shared between days; treat
+    them as read-only. minutes overrides the allocation (see
+    allocate_minutes_batch).
+    """
+    dates, deadline_review = days
+    if not dates:
+        return []
+    if minutes is None:
+        minutes = allocate_minutes(subjects, knowledge_levels, available_hours)
+    tasks, day_end = day_template(subjects, minutes, start_hour, end_hour, break_mins)
+
+    last_tasks = tasks
+    if deadline_review and day_end < end_hour * 60:
+        last_tasks = tasks + [{"time": f"{_fmt(day_end)} - {end_hour:02d}:00", "subject": "Deadline Review"}]
+
+    plan = [{"date": day.strftime('%A, %d-%m-%Y'), "tasks": tasks} for day in dates[:-1]]
+    plan.append({"date": dates[-1].strftime('%A, %d-%m-%Y'), "tasks": last_tasks})
+    return plan
+
+def build_cohort_plans(requests):
+    """Yield (allocations, plan) for each parsed request (see parse_plan_request).
+
+    Allocations are computed for everyone at once; students with the same
+    subjects, minutes, hours and dates share one plan object.
+    """
+    minutes_lists = allocate_minutes_batch([r["subjects"] for r in requests],
+                                           [r["knowledge_levels"] for r in requests],
+                                           [r["available_hours"] for r in requests])
+    plans = {}
+    for r, minutes in zip(requests, minutes_lists):
+        dates, review = r["days"]
+        key = (tuple(r["subjects"]), tuple(minutes), r["start_hour"], r["end_hour"], r["break_mins"],
+               dates[0] if dates else None, len(dates), review)
+        if key not in plans:
+            plans[key] = build_plan(**r, minutes=minutes)
+        yield dict(zip(r["subjects"], minutes)), plans[key]
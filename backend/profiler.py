@@ -0,0 +1,111 @@
+from flask import Blueprint, request, jsonify, g, send_from_directory, abort
+import os
+import cProfile
+import random
+import threading
+from datetime import datetime
+from utils import admin_required, is_admin
+
+profiler_bp = Blueprint("profiler_bp", __name__)
+
+# CONFIG
+PROFILE_FOLDER = "profiles"
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", 50))
+
+# Sample 1-in-N requests per endpoint, e.g. PROFILE_SAMPLE="main.summarize=20,video_summarizer=5".
+# A name without a blueprint ("summarize") matches that view in any blueprint.
+PROFILE_SAMPLE = {}
+for item in os.environ.get("PROFILE_SAMPLE", "").split(","):
+    if "=" in item:
+        endpoint, n = item.split("=", 1)
+        try:
+            PROFILE_SAMPLE[endpoint.strip()] = max(int(n), 1)
+        except ValueError:
+            pass
+
+_lock = threading.Lock()
+
+# ------------------------
+# Helpers
+# ------------------------
+def _wants_profile():
+    """Admins opt in per request; everything else is sampled per endpoint."""
+    flag = request.headers.get("X-Profile") or request.args.get("__profile")
+    if flag and flag not in ("0", "false") and is_admin():
+        return True
+    endpoint = request.endpoint or ""
+    n = PROFILE_SAMPLE.get(endpoint) or PROFILE_SAMPLE.get(endpoint.rsplit(".", 1)[-1])
+    return bool(n) and random.randrange(n) == 0
+
+def _rotate():
+    """Keep at most PROFILE_MAX_FILES dumps, dropping the oldest first."""
+    files = sorted(
+        (os.path.join(PROFILE_FOLDER, f) for f in os.listdir(PROFILE_FOLDER) if f.endswith(".prof")),
+        key=os.path.getmtime,
+    )
+    for path in files[:max(len(files) - PROFILE_MAX_FILES, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _dump(profile, elapsed):
+    os.makedirs(PROFILE_FOLDER, exist_ok=True)
+    endpoint = (request.endpoint or "unknown").replace(".", "-")
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    name = f"{stamp}_{endpoint}_{int(elapsed * 1000)}ms.prof"
+    profile.dump_stats(os.path.join(PROFILE_FOLDER, name))
+    with _lock:
+        _rotate()
+    print(f"[INFO] Profile written: {name}")
+
+# ------------------------
+# Request hooks
+# ------------------------
+@profiler_bp.before_app_request
+def start_profile():
+    if not _wants_profile():
+        return
+    g.profile = cProfile.Profile()
+    g.profile_start = datetime.utcnow()
+    g.profile.enable()
+
+@profiler_bp.teardown_app_request
+def stop_profile(exception):
+    profile = g.pop("profile", None)
+    if profile is None:
+        return
+    profile.disable()
+    elapsed = (datetime.utcnow() - g.pop("profile_start")).total_seconds()
+    try:
+        _dump(profile, elapsed)
+    except Exception as e:
+        print("[ERROR] Writing profile:", e)
+
+# ------------------------
+# Routes
+# ------------------------
+@profiler_bp.route("/admin/profiles")
+@admin_required
+def list_profiles():
+    if not os.path.isdir(PROFILE_FOLDER):
+        return jsonify({"profiles": []})
+    profiles = []
+    for name in os.listdir(PROFILE_FOLDER):
+        if not name.endswith(".prof"):
+            continue
+        stat = os.stat(os.path.join(PROFILE_FOLDER, name))
+        profiles.append({
+            "name": name,
+            "size": stat.st_size,
+            "created_at": datetime.utcfromtimestamp(stat.st_mtime).isoformat()
+        })
+    profiles.sort(key=lambda p: p["created_at"], reverse=True)
+    return jsonify({"profiles": profiles})
+
+@profiler_bp.route("/admin/profiles/<name>")
+@admin_required
+def download_profile(name):
+    if not name.endswith(".prof") or os.path.basename(name) != name:
+        abort(404)
+    return send_from_directory(os.path.abspath(PROFILE_FOLDER), name, as_attachment=True)
@@ -0,0 +1,279 @@
+"""Progress bus for long-running tools (PDF to audio, video, PDF summaries).
+
+Pipelines create a job, then publish stage / percentage updates to it.
+Clients poll ``/progress/<id>``, which answers at once and holds no server
+thread between polls. With PROGRESS_SSE=1 they follow server-sent events
+on ``/progress/<id>/events`` instead; each open stream then holds a
+server thread (see gunicorn.conf.py). Both read the same state. Every
+update bumps the job's version, which doubles as the SSE event id so a
+reconnecting EventSource resumes without replaying.
+
+Jobs live in the memory of the process running them; every update is also
+written through to SQLite so the other workers of a pre-fork server (see
+wsgi.py) can answer polls, streams and cancel requests for them.
+"""
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_login import current_user, login_required
+import os
+import json
+import secrets
+import sqlite3
+import threading
+import time
+
+progress_bp = Blueprint("progress_bp", __name__)
+
+# CONFIG
+DB_PATH = "users.db"
+JOB_RETENTION_SECONDS = 3600
+# Server-sent events hold a worker thread per viewer, so they are opt-in; polling is the default
+PROGRESS_SSE = os.environ.get("PROGRESS_SSE", "0") == "1"
+SSE_HEARTBEAT_SECONDS = int(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+SSE_MAX_SECONDS = int(os.environ.get("SSE_MAX_SECONDS", 1800))
+POLL_INTERVAL_MS = 2000
+# First re-read of SQLite while waiting on state written by another process; doubles up to the heartbeat
+SHARED_POLL_SECONDS = float(os.environ.get("PROGRESS_SHARED_POLL_SECONDS", 0.5))
+
+FINISHED = ("done", "error", "cancelled")
+
+# Job state by id: {"id", "user_id", "tool", "state", "stage", "progress", "version", ...}
+# state: queued -> running -> done | error | cancelled
+_jobs = {}
+_changed = threading.Condition()
+
+def get_conn():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_progress_db(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS progress_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            version INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_progress_jobs_updated ON progress_jobs(updated_at)")
+    conn.commit()
+
+def create_job(user_id, tool, **fields):
+    job_id = secrets.token_urlsafe(12)
+    now = time.time()
+    with _changed:
+        _prune(now)
+        _jobs[job_id] = dict({"id": job_id, "user_id": user_id, "tool": tool, "state": "queued", "stage": "queued",
+                              "progress": 0, "version": 1, "created_at": now, "updated_at": now}, **fields)
+        snapshot = _snapshot(_jobs[job_id])
+    _store(snapshot, prune_before=now - JOB_RETENTION_SECONDS)
+    return job_id
+
+def publish(job_id, **fields):
+    """Merge fields into the job and wake its subscribers. Finished jobs are frozen."""
+    with _changed:
+        job = _jobs.get(job_id)
+        if job is None or job["state"] in FINISHED:
+            return False
+        job.update(fields)
+        job["version"] += 1
+        job["updated_at"] = time.time()
+        if job["state"] in FINISHED:
+            job["finished_at"] = job["updated_at"]
+        snapshot = _snapshot(job)
+        _changed.notify_all()
+    _store(snapshot)
+    return True
+
+def discard(job_id):
+    """Forget a job that never started (e.g. rejected by a full queue)."""
+    with _changed:
+        _jobs.pop(job_id, None)
+    conn = get_conn()
+    with conn:
+        conn.execute("DELETE FROM progress_jobs WHERE id = ?", (job_id,))
+    conn.close()
+
+def fail(job_id, error):
+    return publish(job_id, state="error", stage="error", progress=-1, error=str(error))
+
+def get_job(job_id):
+    """Snapshot of the job (safe to serialize), or None."""
+    with _changed:
+        job = _jobs.get(job_id)
+        snapshot = _snapshot(job) if job is not None else None
+    if snapshot is None:
+        return _load(job_id)
+    if snapshot["state"] == "queued":
+        return _sync_queued(job_id) or snapshot
+    return snapshot
+
+def wait_for_update(job_id, version, timeout):
+    """Block until the job's version exceeds version or timeout passes; returns a snapshot or None."""
+    deadline = time.monotonic() + timeout
+    # SQLite is re-read with a growing interval, so a long wait costs a handful of queries
+    interval = SHARED_POLL_SECONDS
+    if not _is_local(job_id):
+        # Owned by another worker: follow its write-through copy
+        while True:
+            job = _load(job_id)
+            if job is None or job["version"] > version or time.monotonic() >= deadline:
+                return job
+            time.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+            interval = min(interval * 2, SSE_HEARTBEAT_SECONDS)
+    while True:
+        with _changed:
+            job = _jobs.get(job_id)
+            if job is None or job["version"] > version:
+                return _snapshot(job) if job is not None else None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return _snapshot(job)
+            # A queued job can be cancelled from another worker; that lands only in SQLite
+            queued = job["state"] == "queued"
+            _changed.wait(min(remaining, interval) if queued else remaining)
+        if queued:
+            _sync_queued(job_id)
+            interval = min(interval * 2, SSE_HEARTBEAT_SECONDS)
+
+def request_cancel(job_id):
+    """Flag a job for cancellation; the process running it checks cancel_requested.
+
+    A job still queued is marked cancelled in SQLite right away, so every
+    worker shows it cancelled without waiting for its owner to pick it up.
+    """
+    now = time.time()
+    conn = get_conn()
+    with conn:
+        conn.execute("UPDATE progress_jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        conn.execute('''
+            UPDATE progress_jobs SET version = version + 1, updated_at = ?,
+                data = json_set(data, '$.state', 'cancelled', '$.stage', 'cancelled', '$.version', version + 1,
+                                '$.updated_at', ?, '$.finished_at', ?)
+            WHERE id = ? AND json_extract(data, '$.state') = 'queued'
+        ''', (now, now, now, job_id))
+    conn.close()
+
+def cancel_requested(job_id):
+    conn = get_conn()
+    try:
+        row = conn.execute("SELECT cancel_requested FROM progress_jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return bool(row and row["cancel_requested"])
+
+def _sync_queued(job_id):
+    """Adopt a cancel written to SQLite by another worker for a job queued here; returns a snapshot."""
+    stored = _load(job_id)
+    with _changed:
+        job = _jobs.get(job_id)
+        if job is None:
+            return stored
+        if job["state"] == "queued" and stored and stored["state"] == "cancelled" and stored["version"] > job["version"]:
+            job.update(stored)
+            _changed.notify_all()
+        return _snapshot(job)
+
+def _is_local(job_id):
+    with _changed:
+        return job_id in _jobs
+
+def _store(snapshot, prune_before=None):
+    # Out-of-order writes from concurrent publishes never roll a job back
+    conn = get_conn()
+    with conn:
+        conn.execute('''
+            INSERT INTO progress_jobs (id, user_id, version, data, updated_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET version = excluded.version, data = excluded.data,
+                updated_at = excluded.updated_at
+            WHERE excluded.version > progress_jobs.version
+        ''', (snapshot["id"], snapshot["user_id"], snapshot["version"], json.dumps(snapshot),
+              snapshot["updated_at"]))
+        if prune_before is not None:
+            conn.execute("DELETE FROM progress_jobs WHERE updated_at < ? AND json_extract(data, '$.state') IN (?, ?, ?)",
+                         (prune_before,) + FINISHED)
+    conn.close()
+
+def _load(job_id):
+    conn = get_conn()
+    try:
+        row = conn.execute("SELECT data FROM progress_jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row["data"]) if row else None
+
+def _snapshot(job):
+    return {k: (list(v) if isinstance(v, list) else v) for k, v in job.items()}
+
+def _prune(now):
+    cutoff = now - JOB_RETENTION_SECONDS
+    for job_id in [j for j, s in _jobs.items() if s.get("finished_at") and s["finished_at"] < cutoff]:
+        del _jobs[job_id]
+
+def job_urls(job_id):
+    urls = {"job_id": job_id, "status_url": f"/progress/{job_id}", "poll_interval_ms": POLL_INTERVAL_MS}
+    if PROGRESS_SSE:
+        urls["events_url"] = f"/progress/{job_id}/events"
+    return urls
+
+def owned_job(job_id):
+    job = get_job(job_id)
+    if job is None or job["user_id"] != current_user.id:
+        return None
+    return job
+
+# ----------------- Routes -----------------
+@progress_bp.route("/progress/<job_id>")
+@login_required
+def progress_status(job_id):
+    """Job state for polling clients (the default); same payload as the SSE data lines."""
+    job = owned_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@progress_bp.route("/progress/<job_id>/events")
+@login_required
+def progress_events(job_id):
+    """Server-sent events (PROGRESS_SSE=1): one "progress" event per update, closed once the job finishes."""
+    if not PROGRESS_SSE:
+        # 204 stops EventSource from reconnecting; progress.js then polls
+        return "", 204
+    job = owned_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    try:
+        # A reconnecting EventSource sends the last id it saw; only newer state is sent
+        last_seen = int(request.headers.get("Last-Event-ID", 0))
+    except ValueError:
+        last_seen = 0
+    if job["state"] in FINISHED and job["version"] <= last_seen:
+        # Final state already delivered; 204 stops EventSource from reconnecting
+        return "", 204
+    if not _is_local(job_id):
+        # Owned by another worker: a stream here could only re-read SQLite, so send the client to polling
+        return "", 204
+
+    def event(data):
+        return f"id: {data['version']}\nevent: progress\ndata: {json.dumps(data)}\n\n"
+
+    def generate():
+        # Tell the browser how long to wait before reconnecting if the stream drops
+        yield f"retry: {POLL_INTERVAL_MS}\n\n"
+        current = job
+        version = last_seen
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        while current is not None and time.monotonic() < deadline:
+            if current["version"] > version:
+                version = current["version"]
+                yield event(current)
+            elif current["state"] not in FINISHED:
+                yield ": keep-alive\n\n"
+            if current["state"] in FINISHED:
+                return
+            current = wait_for_update(job_id, version, SSE_HEARTBEAT_SECONDS)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
@@ -0,0 +1,226 @@
+"""Offline resource recommender: BM25 over a local catalog.
+
+The catalog is JSONL, one resource per line:
+
+    {"title": ..., "description": ..., "url": ..., "type": "Video", "level": "beginner"}
+
+``build`` turns it into a directory of flat arrays (postings, term
+frequencies, document lengths, levels) plus the raw records, which
+``ResourceIndex`` memory-maps on first use. Each build goes into its own
+versioned directory next to INDEX_DIR, and INDEX_DIR is a symlink that is
+swapped to the new version atomically, so readers always find a complete
+index. Queries touch only the
+postings of their terms, so they stay in the low milliseconds for
+catalogs of 100k+ entries. Rebuild after editing the catalog:
+
+    python resource_index.py build catalog.jsonl --out resource_index
+    python resource_index.py query "linear algebra" --level beginner
+"""
+import argparse
+import glob
+import json
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+INDEX_DIR = os.environ.get("RESOURCE_INDEX_DIR", "resource_index")
+FORMAT_VERSION = 1
+K1, B = 1.2, 0.75
+TITLE_WEIGHT = 2  # title terms count this many times (simple BM25F-style boost)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(['the', 'and', 'of', 'in', 'to', 'a', 'an', 'is', 'for', 'on', 'with', 'as', 'by', 'this',
+                       'that', 'it', 'or', 'at', 'from', 'how', 'what', 'your', 'you'])
+# Level 0 = unspecified; those resources match every level filter
+LEVELS = ["", "beginner", "intermediate", "advanced"]
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+def level_code(level):
+    level = (level or "").strip().lower()
+    return LEVELS.index(level) if level in LEVELS else 0
+
+# ----------------- Build -----------------
+def build(catalog_path, out_dir=INDEX_DIR):
+    """Index a JSONL catalog into out_dir; returns the number of resources."""
+    postings = defaultdict(list)  # term -> [(doc, tf)], docs ascending
+    doc_lens, levels, offsets = [], [], [0]
+    seen_urls = set()
+    out_dir = out_dir.rstrip(os.sep)
+    # A fresh versioned directory per build; one left by a crashed build is removed by the next
+    tmp_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(out_dir)}.v{time.strftime('%Y%m%d%H%M%S')}-",
+                               dir=os.path.dirname(out_dir) or ".")
+    os.chmod(tmp_dir, 0o755)
+
+    with open(catalog_path, encoding="utf-8") as src, open(os.path.join(tmp_dir, "docs.jsonl"), "wb") as docs:
+        for line in src:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            url = (rec.get("url") or "").strip()
+            if not url or url in seen_urls:
+                continue
+            seen_urls.add(url)
+            doc = len(doc_lens)
+            tokens = tokenize(rec.get("title")) * TITLE_WEIGHT + tokenize(rec.get("description"))
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc, tf))
+            doc_lens.append(len(tokens))
+            levels.append(level_code(rec.get("level")))
+            record = {k: rec.get(k) for k in ("title", "description", "url", "type", "level")}
+            docs.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            offsets.append(docs.tell())
+
+    terms = sorted(postings)
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+    post_docs = np.fromiter((d for t in terms for d, _ in postings[t]), dtype=np.uint32, count=int(term_offsets[-1]))
+    post_tf = np.fromiter((min(tf, 65535) for t in terms for _, tf in postings[t]), dtype=np.uint16,
+                          count=int(term_offsets[-1]))
+
+    np.save(os.path.join(tmp_dir, "post_docs.npy"), post_docs)
+    np.save(os.path.join(tmp_dir, "post_tf.npy"), post_tf)
+    np.save(os.path.join(tmp_dir, "term_offsets.npy"), term_offsets)
+    np.save(os.path.join(tmp_dir, "doc_lens.npy"), np.array(doc_lens, dtype=np.uint32))
+    np.save(os.path.join(tmp_dir, "levels.npy"), np.array(levels, dtype=np.uint8))
+    np.save(os.path.join(tmp_dir, "doc_offsets.npy"), np.array(offsets, dtype=np.int64))
+    with open(os.path.join(tmp_dir, "terms.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f, separators=(",", ":"))
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump({"version": FORMAT_VERSION, "docs": len(doc_lens), "terms": len(terms),
+                   "avgdl": (sum(doc_lens) / len(doc_lens)) if doc_lens else 0.0,
+                   "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f)
+
+    _activate(out_dir, tmp_dir)
+    return len(doc_lens)
+
+def _activate(out_dir, version_dir):
+    """Point the out_dir symlink at version_dir in one os.replace, then drop stale versions."""
+    previous = os.path.realpath(out_dir) if os.path.islink(out_dir) else None
+    if os.path.isdir(out_dir) and not os.path.islink(out_dir):
+        # Index built before versioned directories: move it aside once so the link can take its place
+        previous = f"{out_dir}.v0-legacy"
+        os.rename(out_dir, previous)
+    link = f"{out_dir}.link-{os.getpid()}"
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, out_dir)
+    # Keep the version just replaced: workers may still be loading it
+    keep = {os.path.realpath(version_dir), previous}
+    for old in glob.glob(glob.escape(out_dir) + ".v*"):
+        if os.path.realpath(old) not in keep:
+            shutil.rmtree(old, ignore_errors=True)
+
+# ----------------- Query -----------------
+class ResourceIndex:
+    def __init__(self, index_dir=INDEX_DIR):
+        # Resolve the symlink once so every file comes from the same build
+        index_dir = os.path.realpath(index_dir)
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Resource index format {self.manifest.get('version')} is not {FORMAT_VERSION}; rebuild it")
+        load = lambda name: np.load(os.path.join(index_dir, name), mmap_mode="r")
+        self.post_docs = load("post_docs.npy")
+        self.post_tf = load("post_tf.npy")
+        self.term_offsets = load("term_offsets.npy")
+        self.doc_offsets = load("doc_offsets.npy")
+        self.levels = load("levels.npy")
+        with open(os.path.join(index_dir, "terms.json"), encoding="utf-8") as f:
+            self.term_ids = {t: i for i, t in enumerate(json.load(f))}
+        self.n_docs = self.manifest["docs"]
+        # Per-document BM25 length normalization, precomputed once
+        doc_lens = load("doc_lens.npy").astype(np.float32)
+        avgdl = self.manifest["avgdl"] or 1.0
+        self.norm = (K1 * (1 - B + B * doc_lens / avgdl)).astype(np.float32)
+        self._docs_file = open(os.path.join(index_dir, "docs.jsonl"), "rb")
+        self._docs = mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.path.getsize(self._docs_file.name) else b""
+
+    def close(self):
+        if isinstance(self._docs, mmap.mmap):
+            self._docs.close()
+        self._docs_file.close()
+
+    def record(self, doc):
+        start, end = int(self.doc_offsets[doc]), int(self.doc_offsets[doc + 1])
+        return json.loads(self._docs[start:end])
+
+    def search(self, query, level=None, k=10):
+        """Top-k records for query, best first; level keeps that level plus unlabelled resources."""
+        term_ids = [self.term_ids[t] for t in set(tokenize(query)) if t in self.term_ids]
+        if not term_ids:
+            return []
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for tid in term_ids:
+            lo, hi = int(self.term_offsets[tid]), int(self.term_offsets[tid + 1])
+            docs = self.post_docs[lo:hi]
+            tf = self.post_tf[lo:hi].astype(np.float32)
+            idf = np.log(1 + (self.n_docs - (hi - lo) + 0.5) / ((hi - lo) + 0.5))
+            scores[docs] += idf * tf * (K1 + 1) / (tf + self.norm[docs])
+
+        candidates = np.flatnonzero(scores)
+        code = level_code(level)
+        if code:
+            lv = self.levels[candidates]
+            candidates = candidates[(lv == code) | (lv == 0)]
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [dict(self.record(int(d)), score=round(float(scores[d]), 4)) for d in ranked]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Shared index, loaded on first use and reloaded after a rebuild. None if no index was built."""
+    global _index
+    current = os.path.realpath(INDEX_DIR)
+    if not os.path.exists(os.path.join(current, "manifest.json")):
+        return None
+    if _index is None or _index.index_dir != current:
+        with _index_lock:
+            if _index is None or _index.index_dir != current:
+                old, _index = _index, ResourceIndex(current)
+                if old is not None:
+                    old.close()
+    return _index
+
+# ----------------- CLI -----------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="Rebuild the index from a JSONL catalog")
+    b.add_argument("catalog")
+    b.add_argument("--out", default=INDEX_DIR)
+    q = sub.add_parser("query", help="Search the built index")
+    q.add_argument("text")
+    q.add_argument("--level")
+    q.add_argument("-k", type=int, default=10)
+    q.add_argument("--index", default=INDEX_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        t0 = time.perf_counter()
+        n = build(args.catalog, args.out)
+        print(f"Indexed {n} resources into {args.out} in {time.perf_counter() - t0:.1f}s")
+    else:
+        index = ResourceIndex(args.index)
+        t0 = time.perf_counter()
+        results = index.search(args.text, args.level, args.k)
+        elapsed = (time.perf_counter() - t0) * 1000
+        for r in results:
+            print(f"{r['score']:8.3f}  [{r.get('level') or '-'}] {r['title']}  {r['url']}")
+        print(f"{len(results)} results in {elapsed:.2f} ms")
+
+if __name__ == "__main__":
+    main()
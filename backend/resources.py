@@ -1,8 +1,80 @@
 from flask import Blueprint, render_template, request, jsonify, session
+from flask_login import current_user, login_required
+import sqlite3
+from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
+import resource_index
 
 resources_bp = Blueprint("resources_bp", __name__)
 
-# Dummy AI resource generator (replace with real AI logic later)
+DB_PATH = "users.db"
+# Bookmarks live in SQLite; the session only keeps this token once old cookie bookmarks are imported
+BOOKMARKS_SESSION_VERSION = 1
+MAX_BOOKMARK_IMPORT = 1000
+
+def get_conn():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_bookmarks_db(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS bookmarks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            title TEXT NOT NULL,
+            type TEXT,
+            level TEXT,
+            created_at TEXT NOT NULL,
+            UNIQUE (user_id, url),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+    # Keyset pagination per user
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_user ON bookmarks(user_id, id)")
+    conn.commit()
+
+# ----------------- Bookmark store -----------------
+def normalize_url(url):
+    """Dedupe key: lower-case scheme and host, no fragment, no trailing slash on the path."""
+    parts = urlsplit((url or "").strip())
+    path = parts.path.rstrip("/") if parts.path != "/" else ""
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+def _bookmark_row(user_id, bookmark, now):
+    if not isinstance(bookmark, dict):
+        return None
+    url = normalize_url(bookmark.get("url"))
+    if not url:
+        return None
+    title = str(bookmark.get("title") or url)[:500]
+    return (user_id, url, title, bookmark.get("type"), bookmark.get("level"), now)
+
+def add_bookmarks(conn, user_id, bookmarks):
+    """Insert bookmarks in one batch; a URL the user already saved is updated, not duplicated."""
+    now = datetime.utcnow().isoformat()
+    rows = [r for r in (_bookmark_row(user_id, b, now) for b in bookmarks[:MAX_BOOKMARK_IMPORT]) if r]
+    with conn:
+        conn.executemany("""
+            INSERT INTO bookmarks (user_id, url, title, type, level, created_at) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, url) DO UPDATE SET
+                title = excluded.title, type = COALESCE(excluded.type, type), level = COALESCE(excluded.level, level)
+        """, rows)
+    return len(rows)
+
+def import_session_bookmarks(conn):
+    """Move bookmarks left in the session cookie by the old implementation into the table."""
+    # Touch the session only when there is something to change, so the cookie is not rewritten
+    legacy = session.pop("bookmarks") if "bookmarks" in session else None
+    imported = add_bookmarks(conn, current_user.id, legacy) if isinstance(legacy, list) and legacy else 0
+    if session.get("bookmarks_v") != BOOKMARKS_SESSION_VERSION:
+        session["bookmarks_v"] = BOOKMARKS_SESSION_VERSION
+    return imported
+
+RECOMMENDATIONS_PER_QUERY = 10
+
+# Placeholder links, used only until a catalog index has been built (see resource_index.py)
 def generate_resources(topic, level):
     resources = [
         {"title": f"{topic} - Beginner Guide", "url": "https://example.com/article1", "type": "Article", "level": level},
@@ -23,21 +95,71 @@ def get_resources():
     data = request.get_json()
     topic = data.get("topic", "")
     level = data.get("level", "beginner")
-    resources = generate_resources(topic, level)
-    return jsonify(resources)
+    index = resource_index.get_index()
+    if index is None:
+        return jsonify(generate_resources(topic, level))
+    return jsonify(index.search(topic, level, RECOMMENDATIONS_PER_QUERY))
 
-# Route to save bookmarked resources in session
+# Route to save a bookmarked resource
 @resources_bp.route("/save_bookmark", methods=["POST"])
+@login_required
 def save_bookmark():
-    data = request.get_json()
+    data = request.get_json() or {}
     bookmark = data.get("bookmark")
-    if "bookmarks" not in session:
-        session["bookmarks"] = []
-    session["bookmarks"].append(bookmark)
-    session.modified = True
-    return jsonify({"status": "success", "bookmarks": session["bookmarks"]})
+    conn = get_conn()
+    try:
+        import_session_bookmarks(conn)
+        if not add_bookmarks(conn, current_user.id, [bookmark]):
+            return jsonify({"status": "error", "message": "Bookmark needs a URL"}), 400
+        row = conn.execute("SELECT id, url, title, type, level, created_at FROM bookmarks WHERE user_id = ? AND url = ?",
+                           (current_user.id, normalize_url(bookmark.get("url")))).fetchone()
+    finally:
+        conn.close()
+    return jsonify({"status": "success", "bookmark": dict(row)})
 
 # Route to fetch saved bookmarks
 @resources_bp.route("/get_bookmarks")
+@login_required
 def get_bookmarks():
-    return jsonify(session.get("bookmarks", []))
+    """Keyset-paginated listing: ?limit=50&after=<last id>."""
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 200)
+    after = request.args.get("after", 0, type=int)
+    conn = get_conn()
+    try:
+        import_session_bookmarks(conn)
+        rows = conn.execute("""
+            SELECT id, url, title, type, level, created_at FROM bookmarks
+            WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?
+        """, (current_user.id, after, limit + 1)).fetchall()
+    finally:
+        conn.close()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        "bookmarks": [dict(r) for r in rows],
+        "next_cursor": rows[-1]["id"] if has_more else None
+    })
+
+@resources_bp.route("/bookmarks/import", methods=["POST"])
+@login_required
+def import_bookmarks():
+    """Bulk import: bookmarks still in the session plus an optional JSON list {"bookmarks": [...]}."""
+    data = request.get_json(silent=True) or {}
+    conn = get_conn()
+    try:
+        imported = import_session_bookmarks(conn)
+        if isinstance(data.get("bookmarks"), list):
+            imported += add_bookmarks(conn, current_user.id, data["bookmarks"])
+    finally:
+        conn.close()
+    return jsonify({"status": "success", "imported": imported})
+
+@resources_bp.route("/bookmarks/<int:bookmark_id>", methods=["DELETE"])
+@login_required
+def delete_bookmark(bookmark_id):
+    conn = get_conn()
+    with conn:
+        deleted = conn.execute("DELETE FROM bookmarks WHERE id = ? AND user_id = ?",
+                               (bookmark_id, current_user.id)).rowcount
+    conn.close()
+    return jsonify({"success": bool(deleted)})
@@ -0,0 +1,205 @@
+"""Retention for the append-only activity tables.
+
+Raw ``login_activity`` / ``tool_usage`` rows older than the horizon are
+rolled up into ``activity_summary`` (one row per user, event and day),
+written to gzip JSONL archives and deleted in small batches so writers
+are never blocked for long. Each batch's archive is named after its first
+row id and written whole before its delete commits, so a run interrupted
+in between rewrites the same file instead of archiving the rows twice. Freed pages are returned to the OS with
+``PRAGMA incremental_vacuum`` once the database has been switched to
+auto_vacuum=INCREMENTAL. That takes one full VACUUM (an exclusive lock
+for as long as it runs), so it is never done at startup, only on request:
+
+    python retention.py                                # run once
+    python retention.py --enable-incremental-vacuum    # switch (offline), then run
+"""
+from flask import Blueprint, jsonify, request
+import argparse
+import os
+import gzip
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from utils import admin_required
+
+retention_bp = Blueprint("retention_bp", __name__)
+
+# CONFIG
+DB_PATH = "users.db"
+ARCHIVE_FOLDER = "archives"
+RETENTION_DAYS = int(os.environ.get("RETENTION_DAYS", 180))
+RETENTION_BATCH = int(os.environ.get("RETENTION_BATCH", 1000))
+RETENTION_INTERVAL_HOURS = float(os.environ.get("RETENTION_INTERVAL_HOURS", 24))
+VACUUM_STEP_PAGES = 500
+
+# table -> SQL expression used as the summary "event" name
+ACTIVITY_TABLES = {
+    "login_activity": "'login'",
+    "tool_usage": "tool_name",
+}
+
+# Progress of the current / last run
+retention_status = {"state": "idle", "table": None, "deleted": 0, "started_at": None, "finished_at": None}
+_run_lock = threading.Lock()
+
+def get_conn():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+# ------------------------
+# Schema
+# ------------------------
+def init_retention_db(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_summary (
+            user_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            day TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, event, day)
+        )
+    ''')
+    for table in ACTIVITY_TABLES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table}(ts)")
+    conn.commit()
+
+def enable_incremental_vacuum(conn):
+    """Switch the DB to auto_vacuum=INCREMENTAL (one full VACUUM; run from the CLI, not at startup)."""
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        print("[INFO] Database switched to auto_vacuum=INCREMENTAL")
+
+# ------------------------
+# Retention run
+# ------------------------
+def _archive_path(table, first_id):
+    os.makedirs(ARCHIVE_FOLDER, exist_ok=True)
+    return os.path.join(ARCHIVE_FOLDER, f"{table}_{first_id:012d}.jsonl.gz")
+
+def write_archive(table, rows):
+    """Write one batch atomically; a retried batch starts at the same id and replaces its file."""
+    path = _archive_path(table, rows[0]["id"])
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as archive:
+        for r in rows:
+            d = dict(r)
+            d.pop("event")
+            archive.write(json.dumps(d) + "\n")
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def purge_table(conn, table, cutoff, batch_size=RETENTION_BATCH):
+    """Summarize, archive and delete rows older than cutoff, one batch per transaction."""
+    event = ACTIVITY_TABLES[table]
+    deleted = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT *, {event} AS event FROM {table} WHERE ts < ? ORDER BY id LIMIT ?",
+            (cutoff, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+
+        write_archive(table, rows)
+
+        counts = {}
+        for r in rows:
+            key = (r["user_id"], r["event"], str(r["ts"])[:10])
+            counts[key] = counts.get(key, 0) + 1
+
+        ids = [(r["id"],) for r in rows]
+        with conn:
+            conn.executemany("""
+                INSERT INTO activity_summary (user_id, event, day, count)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id, event, day) DO UPDATE SET count = count + excluded.count
+            """, [(u, e, d, c) for (u, e, d), c in counts.items()])
+            conn.executemany(f"DELETE FROM {table} WHERE id = ?", ids)
+
+        deleted += len(rows)
+        retention_status["deleted"] += len(rows)
+        # Let other writers in between batches
+        time.sleep(0.01)
+    return deleted
+
+def incremental_vacuum(conn):
+    """Release free pages a step at a time so the write lock is held briefly."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    freed = 0
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while free:
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining >= free:
+            break
+        freed += free - remaining
+        free = remaining
+    return freed
+
+def run_retention(days=RETENTION_DAYS, batch_size=RETENTION_BATCH):
+    if not _run_lock.acquire(blocking=False):
+        return None
+    try:
+        cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
+        retention_status.update(state="running", deleted=0, started_at=datetime.utcnow().isoformat(), finished_at=None)
+        conn = get_conn()
+        try:
+            result = {}
+            for table in ACTIVITY_TABLES:
+                retention_status["table"] = table
+                result[table] = purge_table(conn, table, cutoff, batch_size)
+            result["pages_freed"] = incremental_vacuum(conn)
+        finally:
+            conn.close()
+        retention_status.update(state="idle", table=None, finished_at=datetime.utcnow().isoformat(), last_result=result)
+        print(f"[INFO] Retention run finished: {result}")
+        return result
+    except Exception as e:
+        retention_status.update(state="error", error=str(e), finished_at=datetime.utcnow().isoformat())
+        print("[ERROR] Retention run failed:", e)
+        return None
+    finally:
+        _run_lock.release()
+
+def start_retention_scheduler(interval_hours=RETENTION_INTERVAL_HOURS):
+    """Run retention periodically in a daemon thread."""
+    def loop():
+        while True:
+            run_retention()
+            time.sleep(interval_hours * 3600)
+    threading.Thread(target=loop, daemon=True, name="retention").start()
+
+# ------------------------
+# Routes
+# ------------------------
+@retention_bp.route("/admin/retention")
+@admin_required
+def retention_progress():
+    return jsonify(retention_status)
+
+@retention_bp.route("/admin/retention", methods=["POST"])
+@admin_required
+def retention_trigger():
+    days = request.args.get("days", RETENTION_DAYS, type=int)
+    threading.Thread(target=run_retention, args=(days,), daemon=True).start()
+    return jsonify({"status": "started", "days": days})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roll up, archive and delete old activity rows")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Switch the DB to auto_vacuum=INCREMENTAL first (full VACUUM; stop the app)")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS)
+    args = parser.parse_args()
+    conn = get_conn()
+    init_retention_db(conn)
+    if args.enable_incremental_vacuum:
+        enable_incremental_vacuum(conn)
+    conn.close()
+    print(run_retention(args.days))
@@ -0,0 +1,39 @@
+// Follow a job on the progress bus: polling by default, server-sent events
+// when the server offers them (job.events_url, PROGRESS_SSE=1). onUpdate gets every new job snapshot;
+// following stops once the job is done, errored or cancelled.
+function followJob(job, onUpdate) {
+    const finished = (data) => ['done', 'error', 'cancelled'].includes(data.state);
+    let lastVersion = 0;
+
+    function deliver(data) {
+        if (data.version <= lastVersion) return false;
+        lastVersion = data.version;
+        onUpdate(data);
+        return finished(data);
+    }
+
+    function poll() {
+        const timer = setInterval(() => {
+            fetch(job.status_url)
+            .then(res => res.json())
+            .then(data => {
+                if (data.error && !data.state) { clearInterval(timer); return; }
+                if (deliver(data)) clearInterval(timer);
+            })
+            .catch(err => console.error(err));
+        }, job.poll_interval_ms || 2000);
+    }
+
+    if (!window.EventSource || !job.events_url) {
+        poll();
+        return;
+    }
+    const source = new EventSource(job.events_url);
+    source.addEventListener('progress', (e) => {
+        if (deliver(JSON.parse(e.data))) source.close();
+    });
+    source.onerror = () => {
+        // The browser retries on its own; fall back to polling only if it gave up
+        if (source.readyState === EventSource.CLOSED) poll();
+    };
+}
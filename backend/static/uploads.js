@@ -0,0 +1,46 @@
+// Resumable chunked upload (see uploads.py). Resolves to the finished
+// upload's id, which tools take as the upload_id form field in place of
+// the file. A failed chunk is retried with backoff; the server reports
+// where to carry on, so a dropped connection never restarts the file.
+// onProgress(sentBytes, totalBytes) follows each chunk.
+async function uploadInChunks(file, tool, onProgress) {
+    async function json(res) {
+        const data = await res.json();
+        if (!res.ok) throw new Error(data.error || res.statusText);
+        return data;
+    }
+
+    let upload = await json(await fetch('/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ tool: tool, filename: file.name, size: file.size })
+    }));
+    let failures = 0;
+    while (upload.received < upload.size) {
+        const start = upload.next_chunk * upload.chunk_size;
+        let res;
+        try {
+            res = await fetch(`/uploads/${upload.upload_id}/chunks/${upload.next_chunk}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: file.slice(start, start + upload.chunk_size)
+            });
+        } catch (err) {
+            res = null;
+        }
+        if (!res || res.status >= 500) {
+            failures += 1;
+            if (failures > 8) throw new Error('Upload failed, check your connection and try again');
+            await new Promise(resolve => setTimeout(resolve, Math.min(30000, 1000 * 2 ** failures)));
+            continue;
+        }
+        const data = await res.json();
+        // 409: out of step with the server; its reply says which chunk comes next
+        if (!res.ok && res.status !== 409) throw new Error(data.error || res.statusText);
+        upload = data;
+        failures = 0;
+        if (onProgress) onProgress(upload.received, upload.size);
+    }
+    await json(await fetch(`/uploads/${upload.upload_id}/complete`, { method: 'POST' }));
+    return upload.upload_id;
+}
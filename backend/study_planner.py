@@ -1,104 +1,145 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, Response, stream_with_context
 from flask_login import current_user, login_required
-import sqlite3, datetime
+import sqlite3, datetime, json, csv, io, os
+from plan_scheduler import parse_plan_request, build_plan, build_cohort_plans
+from utils import instructor_required, record_tool_usage_many
+from artifacts import reserve_artifact, finalize_artifact, delete_artifacts, artifact_url, get_conn as get_artifacts_conn
 
 study_bp = Blueprint('study_bp', __name__)
 DATABASE = "users.db"
 
+# Cohort uploads: one row per student
+COHORT_MAX_ROWS = int(os.environ.get("COHORT_MAX_ROWS", 5000))
+COHORT_FLUSH_ROWS = 200
+COHORT_FORMATS = {"jsonl": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
 def get_db():
     conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row
     return conn
 
-# ---------- PAGE ----------
-@study_bp.route('/study_planner')
-@login_required
-def study_planner():
-    return render_template('study_planner.html')
+def init_study_plans_db(conn):
+    """Saved plans, one row per planned day, and the link from calendar rows back to plan blocks."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS study_plans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            params TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_study_plans_user ON study_plans(user_id)")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS study_plan_days (
+            plan_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            tasks TEXT NOT NULL,
+            PRIMARY KEY (plan_id, day)
+        ) WITHOUT ROWID
+    """)
+    # Calendar rows generated from a plan carry (plan_id, block_key) so re-plans can upsert them
+    columns = [r[1] for r in cur.execute("PRAGMA table_info(schedules)")]
+    for col, ddl in (("end_date", "TEXT"), ("plan_id", "INTEGER"), ("block_key", "TEXT")):
+        if col not in columns:
+            cur.execute(f"ALTER TABLE schedules ADD COLUMN {col} {ddl}")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_schedules_plan_block ON schedules(plan_id, block_key)")
+    conn.commit()
 
-# ---------- GENERATE PLAN ----------
-@study_bp.route('/generate_plan', methods=['POST'])
-@login_required
-def generate_plan():
-    data = request.get_json()
-    subjects = [s.strip() for s in data.get('subjects', [])]
-    knowledge_levels = [k.strip().lower() for k in data.get('knowledge', [])]
-    available_hours = float(data.get('available_hours', 3))
-    preferred_hours = data.get('preferred_hours', '18:00-21:00')
-    breaks_pref = data.get('breaks', '10 mins after every hour')
-    mode = data.get('mode', 'Weekly')
-    deadline_str = data.get('deadline', None)
-
-    # Parse preferred hours
-    try:
-        start_hour, end_hour = [int(h.split(':')[0]) for h in preferred_hours.split('-')]
-    except:
-        start_hour, end_hour = 18, 21
+# ---------- PLAN STORE ----------
+def _day_rows(plan, dates):
+    """{ISO day: (tasks, tasks JSON)}; shared task lists are serialized once."""
+    serialized = {}
+    rows = {}
+    for entry, day in zip(plan, dates):
+        tasks = entry["tasks"]
+        if id(tasks) not in serialized:
+            serialized[id(tasks)] = json.dumps(tasks)
+        rows[day.isoformat()] = (tasks, serialized[id(tasks)])
+    return rows
 
-    # Parse break duration
-    try:
-        break_mins = int(breaks_pref.split()[0])
-    except:
-        break_mins = 10
-
-    # Weight subjects
-    weight_map = {'beginner': 1.5, 'intermediate': 1.0, 'advanced': 0.5}
-    weights = [weight_map.get(k, 1.0) for k in knowledge_levels]
-    total_weight = sum(weights) or 1
-    time_per_subject = [available_hours * 60 * (w / total_weight) for w in weights]  # in minutes
-
-    today = datetime.date.today()
-
-    # Days list
-    if mode.lower() == "weekly":
-        monday = today - datetime.timedelta(days=today.weekday())
-        days = [monday + datetime.timedelta(days=i) for i in range(7)]
-    elif mode.lower() == "deadline" and deadline_str:
-        try:
-            deadline = datetime.datetime.strptime(deadline_str, "%Y-%m-%d").date()
-        except ValueError:
-            deadline = today
-        days = [today + datetime.timedelta(days=i) for i in range((deadline - today).days + 1)]
-    else:
-        days = [today]
-
-    plan = []
-    for day in days:
-        current_time = start_hour * 60
-        day_tasks = []
-        remaining = time_per_subject.copy()
-
-        while any(r > 0 for r in remaining) and current_time < end_hour * 60:
-            for i, subj in enumerate(subjects):
-                if remaining[i] <= 0 or current_time >= end_hour * 60:
-                    continue
-                study_block = min(50, int(remaining[i]), end_hour*60 - current_time)
-                end_time = current_time + study_block
-                day_tasks.append({
-                    "time": f"{current_time//60:02d}:{current_time%60:02d} - {end_time//60:02d}:{end_time%60:02d}",
-                    "subject": subj
-                })
-                current_time = end_time
-                remaining[i] -= study_block
-
-                # Break
-                if current_time + break_mins <= end_hour*60:
-                    day_tasks.append({
-                        "time": f"{current_time//60:02d}:{current_time%60:02d} - {(current_time + break_mins)//60:02d}:{(current_time + break_mins)%60:02d}",
-                        "subject": "Break"
-                    })
-                    current_time += break_mins
-
-        # Deadline review
-        if mode.lower() == "deadline" and day == days[-1] and current_time < end_hour*60:
-            day_tasks.append({
-                "time": f"{current_time//60:02d}:{current_time%60:02d} - {end_hour:02d}:00",
-                "subject": "Deadline Review"
-            })
-
-        plan.append({"date": day.strftime('%A, %d-%m-%Y'), "tasks": day_tasks})
+def _clock(day, hhmm):
+    """ISO datetime for a day and "HH:MM" (24:00 rolls over to the next day)."""
+    hours, minutes = [int(x) for x in hhmm.split(":")]
+    moment = datetime.datetime.fromisoformat(day) + datetime.timedelta(hours=hours, minutes=minutes)
+    return moment.strftime("%Y-%m-%dT%H:%M")
 
-    # -------------------- RECORD TOOL USAGE --------------------
+def _blocks(day, tasks):
+    """Calendar blocks (everything except breaks) keyed by day and position."""
+    blocks = {}
+    for task in tasks:
+        if task["subject"] == "Break":
+            continue
+        start, end = task["time"].split(" - ")
+        blocks[f"{day}#{len(blocks)}"] = (task["subject"], _clock(day, start), _clock(day, end), task["time"])
+    return blocks
+
+def sync_schedules(conn, user_id, plan_id, changed, old_tasks):
+    """Upsert calendar rows for changed days and delete blocks that no longer exist.
+
+    changed maps ISO day -> new tasks (empty list for removed days);
+    old_tasks maps ISO day -> previously stored tasks.
+    """
+    now = datetime.datetime.utcnow().isoformat()
+    upserts, stale = [], []
+    for day, tasks in changed.items():
+        new_blocks = _blocks(day, tasks)
+        upserts += [(user_id, title, start, end, notes, now, plan_id, key)
+                    for key, (title, start, end, notes) in new_blocks.items()]
+        stale += [(plan_id, key) for key in _blocks(day, old_tasks.get(day, [])) if key not in new_blocks]
+    conn.executemany("""
+        INSERT INTO schedules (user_id, title, date, end_date, notes, created_at, plan_id, block_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(plan_id, block_key) DO UPDATE SET
+            title = excluded.title, date = excluded.date, end_date = excluded.end_date, notes = excluded.notes
+    """, upserts)
+    conn.executemany("DELETE FROM schedules WHERE plan_id = ? AND block_key = ?", stale)
+    return len(upserts), len(stale)
+
+def save_plan(conn, user_id, params, plan_id=None, today=None):
+    """Build the plan for params and store only the days that differ from the saved copy.
+
+    Days before today are history and are left untouched. Returns
+    (plan_id, plan, {changed ISO day: tasks}, [removed ISO days]).
+    """
+    today = today or datetime.date.today()
+    kwargs = parse_plan_request(params, today)
+    plan = build_plan(**kwargs)
+    new_rows = _day_rows(plan, kwargs["days"][0])
+
+    old_rows = {}
+    if plan_id is not None:
+        # Re-plan: earlier days of the week keep what was stored for them
+        new_rows = {day: row for day, row in new_rows.items() if day >= today.isoformat()}
+        old_rows = {r["day"]: r["tasks"] for r in conn.execute(
+            "SELECT day, tasks FROM study_plan_days WHERE plan_id = ? AND day >= ?", (plan_id, today.isoformat()))}
+    changed = {day: tasks for day, (tasks, tasks_json) in new_rows.items() if old_rows.get(day) != tasks_json}
+    removed = [day for day in old_rows if day not in new_rows]
+    # Only days whose stored tasks are replaced need their old blocks
+    old_tasks = {day: json.loads(old_rows[day]) for day in list(changed) + removed if day in old_rows}
+
+    now = datetime.datetime.utcnow().isoformat()
+    with conn:
+        if plan_id is None:
+            plan_id = conn.execute("INSERT INTO study_plans (user_id, params, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                                   (user_id, json.dumps(params), now, now)).lastrowid
+        else:
+            conn.execute("UPDATE study_plans SET params = ?, updated_at = ? WHERE id = ?",
+                         (json.dumps(params), now, plan_id))
+        conn.executemany("INSERT OR REPLACE INTO study_plan_days (plan_id, day, tasks) VALUES (?, ?, ?)",
+                         [(plan_id, day, new_rows[day][1]) for day in changed])
+        conn.executemany("DELETE FROM study_plan_days WHERE plan_id = ? AND day = ?",
+                         [(plan_id, day) for day in removed])
+        sync = dict(changed, **{day: [] for day in removed})
+        sync_schedules(conn, user_id, plan_id, sync, old_tasks)
+    return plan_id, plan, changed, removed
+
+def get_user_plan(conn, plan_id, user_id):
+    return conn.execute("SELECT * FROM study_plans WHERE id = ? AND user_id = ?", (plan_id, user_id)).fetchone()
+
+def record_planner_usage(user_id):
     try:
         conn = get_db()
         cur = conn.cursor()
@@ -106,18 +147,213 @@ def generate_plan():
         cur.execute("""
             INSERT INTO tool_usage (user_id, tool_name, ts)
             VALUES (?, ?, ?)
-        """, (current_user.id, "Adaptive Study Planner", datetime.datetime.utcnow().isoformat()))
+        """, (user_id, "Adaptive Study Planner", datetime.datetime.utcnow().isoformat()))
         
         # Increment study_planner_count
         cur.execute("""
             UPDATE users 
             SET study_planner_count = COALESCE(study_planner_count, 0) + 1 
             WHERE id = ?
-        """, (current_user.id,))
+        """, (user_id,))
         conn.commit()
         conn.close()
-        print(f"[INFO] Adaptive Study Planner usage recorded for user {current_user.id}")
+        print(f"[INFO] Adaptive Study Planner usage recorded for user {user_id}")
     except Exception as e:
         print("Error recording study planner usage:", e)
 
-    return jsonify({"plan": plan})
+# ---------- PAGE ----------
+@study_bp.route('/study_planner')
+@login_required
+def study_planner():
+    return render_template('study_planner.html')
+
+# ---------- GENERATE PLAN ----------
+@study_bp.route('/generate_plan', methods=['POST'])
+@login_required
+def generate_plan():
+    """Build and save a plan. Passing plan_id re-plans that saved plan instead of creating one."""
+    data = request.get_json()
+    plan_id = data.pop('plan_id', None)
+    conn = get_db()
+    try:
+        if plan_id is not None and get_user_plan(conn, plan_id, current_user.id) is None:
+            return jsonify({"error": "Plan not found"}), 404
+        plan_id, plan, changed, removed = save_plan(conn, current_user.id, data, plan_id)
+    finally:
+        conn.close()
+
+    # -------------------- RECORD TOOL USAGE --------------------
+    record_planner_usage(current_user.id)
+
+    return jsonify({"plan": plan, "plan_id": plan_id, "changed_days": list(changed), "removed_days": removed})
+
+# ---------- SAVED PLANS ----------
+@study_bp.route('/study_plans')
+@login_required
+def list_study_plans():
+    conn = get_db()
+    rows = conn.execute("SELECT id, params, created_at, updated_at FROM study_plans WHERE user_id = ? ORDER BY updated_at DESC",
+                        (current_user.id,)).fetchall()
+    conn.close()
+    return jsonify([dict(r, params=json.loads(r["params"])) for r in rows])
+
+@study_bp.route('/study_plans/<int:plan_id>')
+@login_required
+def get_study_plan(plan_id):
+    conn = get_db()
+    row = get_user_plan(conn, plan_id, current_user.id)
+    if row is None:
+        conn.close()
+        return jsonify({"error": "Plan not found"}), 404
+    days = [{"day": r["day"], "tasks": json.loads(r["tasks"])} for r in conn.execute(
+        "SELECT day, tasks FROM study_plan_days WHERE plan_id = ? ORDER BY day", (plan_id,))]
+    conn.close()
+    return jsonify({"id": plan_id, "params": json.loads(row["params"]), "updated_at": row["updated_at"], "days": days})
+
+@study_bp.route('/study_plans/<int:plan_id>', methods=['PATCH'])
+@login_required
+def update_study_plan(plan_id):
+    """Edit a saved plan and re-plan it; only the days that changed are rewritten and returned.
+
+    Body: any /generate_plan fields to replace, or {"subject": ..., "knowledge_level": ...}
+    to change one subject's level.
+    """
+    data = request.get_json() or {}
+    conn = get_db()
+    try:
+        row = get_user_plan(conn, plan_id, current_user.id)
+        if row is None:
+            return jsonify({"error": "Plan not found"}), 404
+        params = json.loads(row["params"])
+        subject = data.pop('subject', None)
+        level = data.pop('knowledge_level', None)
+        if subject is not None:
+            subjects = [s.strip() for s in params.get('subjects', [])]
+            if subject.strip() not in subjects:
+                return jsonify({"error": "Unknown subject"}), 400
+            knowledge = list(params.get('knowledge', []))
+            knowledge += ['intermediate'] * (len(subjects) - len(knowledge))
+            knowledge[subjects.index(subject.strip())] = level or 'intermediate'
+            params['knowledge'] = knowledge
+        params.update(data)
+        plan_id, plan, changed, removed = save_plan(conn, current_user.id, params, plan_id)
+    finally:
+        conn.close()
+
+    return jsonify({"plan_id": plan_id, "days": changed, "removed_days": removed})
+
+@study_bp.route('/study_plans/<int:plan_id>', methods=['DELETE'])
+@login_required
+def delete_study_plan(plan_id):
+    conn = get_db()
+    try:
+        if get_user_plan(conn, plan_id, current_user.id) is None:
+            return jsonify({"error": "Plan not found"}), 404
+        with conn:
+            conn.execute("DELETE FROM schedules WHERE plan_id = ?", (plan_id,))
+            conn.execute("DELETE FROM study_plan_days WHERE plan_id = ?", (plan_id,))
+            conn.execute("DELETE FROM study_plans WHERE id = ?", (plan_id,))
+    finally:
+        conn.close()
+    return jsonify({"status": "deleted", "plan_id": plan_id})
+
+# ---------- COHORT PLANS (instructors) ----------
+def _split_list(value):
+    return [v.strip() for v in (value or "").replace("|", ";").split(";") if v.strip()]
+
+def read_cohort_csv(stream, today=None):
+    """(students, parsed requests) from a CSV with columns
+    student, subjects, knowledge, available_hours, preferred_hours, breaks, mode, deadline.
+
+    subjects and knowledge are ";"-separated; empty cells fall back to the /generate_plan defaults.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    students, requests = [], []
+    days_cache = {}
+    for row in reader:
+        if len(students) >= COHORT_MAX_ROWS:
+            raise ValueError(f"At most {COHORT_MAX_ROWS} students per upload")
+        row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+        payload = {k: row[k] for k in ("available_hours", "preferred_hours", "breaks", "mode", "deadline") if row.get(k)}
+        payload["subjects"] = _split_list(row.get("subjects"))
+        payload["knowledge"] = _split_list(row.get("knowledge"))
+        students.append(row.get("student") or f"row {reader.line_num}")
+        requests.append(parse_plan_request(payload, today, days_cache))
+    return students, requests
+
+def _cohort_chunks(students, requests, fmt):
+    """Serialized output in chunks of COHORT_FLUSH_ROWS students."""
+    buf = io.StringIO()
+    writer = csv.writer(buf) if fmt == "csv" else None
+    if writer:
+        writer.writerow(["student", "date", "time", "subject", "minutes_per_day"])
+    for n, (student, (allocations, plan)) in enumerate(zip(students, build_cohort_plans(requests)), 1):
+        if writer:
+            for day in plan:
+                for task in day["tasks"]:
+                    writer.writerow([student, day["date"], task["time"], task["subject"],
+                                     allocations.get(task["subject"], "")])
+        else:
+            buf.write(json.dumps({"student": student, "allocations": allocations, "plan": plan}) + "\n")
+        if n % COHORT_FLUSH_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+def _student_user_ids(students):
+    """Account ids for students given by email, resolved in one query."""
+    emails = [s.lower() for s in students if "@" in s]
+    if not emails:
+        return []
+    conn = get_db()
+    by_email = {r["email"]: r["id"] for r in conn.execute(
+        "SELECT id, lower(email) AS email FROM users WHERE lower(email) IN (SELECT value FROM json_each(?))",
+        (json.dumps(emails),))}
+    conn.close()
+    return [by_email[e] for e in emails if e in by_email]
+
+@study_bp.route('/study_plans/cohort', methods=['POST'])
+@login_required
+@instructor_required
+def cohort_plans():
+    """Plans for a whole class from a CSV upload, streamed back as JSONL (default) or CSV.
+
+    The file is also kept in the artifact store; its URL is in the X-Artifact-Url header.
+    """
+    upload = request.files.get("csv_file")
+    if not upload or not upload.filename:
+        return jsonify({"error": "Upload a CSV file as csv_file"}), 400
+    fmt = (request.form.get("format") or request.args.get("format") or "jsonl").lower()
+    if fmt not in COHORT_FORMATS:
+        return jsonify({"error": "format must be jsonl or csv"}), 400
+    try:
+        students, requests = read_cohort_csv(upload.stream)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": str(e)}), 400
+
+    artifact_id, path = reserve_artifact(current_user.id, "cohort_plans", f"cohort_plans.{fmt}", COHORT_FORMATS[fmt])
+    user_ids = _student_user_ids(students)
+
+    def generate():
+        complete = False
+        try:
+            with open(path, "w", encoding="utf-8", newline="") as out:
+                for chunk in _cohort_chunks(students, requests, fmt):
+                    out.write(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete:
+                finalize_artifact(artifact_id)
+                record_tool_usage_many(user_ids, "Adaptive Study Planner")
+            else:
+                conn = get_artifacts_conn()
+                delete_artifacts(conn, [artifact_id])
+                conn.close()
+
+    return Response(stream_with_context(generate()), mimetype=COHORT_FORMATS[fmt], headers={
+        "Content-Disposition": f"attachment; filename=cohort_plans.{fmt}",
+        "X-Artifact-Url": artifact_url(artifact_id),
+        "X-Cohort-Students": str(len(students)),
+    })
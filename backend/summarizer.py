@@ -26,8 +26,11 @@ def extract_text_from_pdf(pdf_path):
     return text.strip()
 
 # ----------------- Summarize text -----------------
-def summarize_text(text, word_count=200):
-    """Summarize text approximately to user-specified word_count."""
+def summarize_text(text, word_count=200, on_progress=None):
+    """Summarize text approximately to user-specified word_count.
+
+    on_progress(done, total) is called after each chunk.
+    """
     # Split text into manageable chunks for summarizer
     paragraphs = [p for p in text.split("\n") if len(p.strip()) > 20]
     chunks = []
@@ -43,7 +46,7 @@ def summarize_text(text, word_count=200):
 
     # Summarize each chunk
     summary_text = ""
-    for chunk in chunks:
+    for i, chunk in enumerate(chunks):
         if len(chunk.strip()) == 0:
             continue
         try:
@@ -51,6 +54,9 @@ def summarize_text(text, word_count=200):
             summary_text += result[0]['summary_text'] + " "
         except:
             continue
+        finally:
+            if on_progress:
+                on_progress(i + 1, len(chunks))
 
     # Truncate to exact word_count
     words = summary_text.split()
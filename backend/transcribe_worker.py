@@ -0,0 +1,27 @@
+"""Whisper transcription of one audio span, in-process or in a pool worker.
+
+video_summarizer.py starts its worker pool through a forkserver, never by
+forking the (threaded, torch-initialised) server process, so the workers
+import only this module and load their own copy of the model.
+"""
+import torch
+import whisper
+
+SAMPLE_RATE = 16000
+_model = None
+
+def init_worker(model_name, threads):
+    global _model
+    torch.set_num_threads(threads)
+    _model = whisper.load_model(model_name)
+
+def transcribe_segment(index, start, audio, model=None):
+    """Transcribe one span; timestamps are shifted back onto the full recording."""
+    res = (model or _model).transcribe(audio)
+    offset = start / SAMPLE_RATE
+    segments = [{
+        "start": round(seg["start"] + offset, 2),
+        "end": round(seg["end"] + offset, 2),
+        "text": seg["text"].strip()
+    } for seg in res.get("segments", [])]
+    return {"index": index, "start": round(offset, 2), "text": res.get("text", "").strip(), "segments": segments}
@@ -0,0 +1,139 @@
+"""Transcript store for the video summarizer.
+
+Entries are keyed by ``yt:<video id>`` for YouTube links or
+``sha256:<hex>`` for uploaded files and hold the timestamped transcript
+plus any summaries derived from it. The store is size-bounded; the least
+recently used entries are evicted first.
+"""
+import os
+import re
+import json
+import sqlite3
+import hashlib
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+DB_PATH = "users.db"
+CACHE_MAX_BYTES = int(float(os.environ.get("TRANSCRIPT_CACHE_MB", 256)) * 1024 * 1024)
+
+YOUTUBE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+YOUTUBE_HOSTS = ("youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com", "youtube-nocookie.com",
+                 "www.youtube-nocookie.com")
+
+def get_conn():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_transcript_cache(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transcript_cache (
+            key TEXT PRIMARY KEY,
+            transcript TEXT NOT NULL,
+            segments TEXT NOT NULL,
+            summaries TEXT NOT NULL DEFAULT '{}',
+            size INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            last_used TEXT NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transcript_cache_lru ON transcript_cache(last_used)")
+    conn.commit()
+
+# ----------------- Keys -----------------
+def parse_youtube_id(link):
+    """Canonical 11-character video id from any common YouTube URL form, or None."""
+    try:
+        url = urlparse(link.strip() if "://" in link else "https://" + link.strip())
+    except ValueError:
+        return None
+    host = (url.hostname or "").lower()
+    parts = [p for p in url.path.split("/") if p]
+    candidate = None
+    if host == "youtu.be" and parts:
+        candidate = parts[0]
+    elif host in YOUTUBE_HOSTS:
+        if url.path == "/watch":
+            candidate = parse_qs(url.query).get("v", [None])[0]
+        elif len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+            candidate = parts[1]
+    if candidate and YOUTUBE_ID_RE.match(candidate):
+        return candidate
+    return None
+
+def file_key(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return "sha256:" + h.hexdigest()
+
+# ----------------- Store -----------------
+def get(key):
+    """Cached entry as a dict, or None. Touches the entry for LRU."""
+    if not key:
+        return None
+    conn = get_conn()
+    try:
+        row = conn.execute("SELECT transcript, segments, summaries FROM transcript_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE transcript_cache SET last_used = ? WHERE key = ?", (datetime.utcnow().isoformat(), key))
+        return {
+            "transcript": row["transcript"],
+            "segments": json.loads(row["segments"]),
+            "summaries": json.loads(row["summaries"]),
+        }
+    finally:
+        conn.close()
+
+def put(key, transcript, segments, summaries=None):
+    if not key:
+        return
+    segments_json = json.dumps(segments)
+    summaries_json = json.dumps(summaries or {})
+    size = len(transcript) + len(segments_json) + len(summaries_json)
+    now = datetime.utcnow().isoformat()
+    conn = get_conn()
+    try:
+        with conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO transcript_cache (key, transcript, segments, summaries, size, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (key, transcript, segments_json, summaries_json, size, now, now))
+        evict(conn)
+    finally:
+        conn.close()
+
+def add_summary(key, length, summary):
+    """Remember a derived summary for an existing entry."""
+    if not key:
+        return
+    conn = get_conn()
+    try:
+        with conn:
+            conn.execute("""
+                UPDATE transcript_cache
+                SET summaries = json_set(summaries, '$."' || ? || '"', ?), size = size + ?
+                WHERE key = ?
+            """, (str(length), summary, len(summary), key))
+    finally:
+        conn.close()
+
+def evict(conn, max_bytes=None):
+    """Drop least recently used entries until the store fits in max_bytes."""
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcript_cache").fetchone()[0]
+    if total <= max_bytes:
+        return 0
+    dropped = []
+    for row in conn.execute("SELECT key, size FROM transcript_cache ORDER BY last_used"):
+        if total <= max_bytes:
+            break
+        dropped.append((row["key"],))
+        total -= row["size"]
+    with conn:
+        conn.executemany("DELETE FROM transcript_cache WHERE key = ?", dropped)
+    print(f"[INFO] Transcript cache evicted {len(dropped)} entries")
+    return len(dropped)
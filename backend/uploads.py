@@ -0,0 +1,378 @@
+"""Resumable chunked uploads for the file-based tools.
+
+Large files (lecture videos, textbooks) go up in fixed-size chunks
+instead of one multipart request:
+
+    POST   /uploads                   {"tool", "filename", "size"} -> {"upload_id", "chunk_size", ...}
+    PUT    /uploads/<id>/chunks/<n>   raw bytes of chunk n
+    GET    /uploads/<id>              how much arrived; carry on from next_chunk
+    POST   /uploads/<id>/complete     -> {"sha256", "size"}
+    DELETE /uploads/<id>
+
+Chunks go in order, straight into the session's file, and are hashed as
+they arrive, so a completed upload usually knows its SHA-256 already. The
+running hash lives in the worker process that took the previous chunk;
+when a chunk lands on another worker (see wsgi.py) it is written unhashed
+and the file is hashed once, whole, on completion. A chunk
+that is sent again after a dropped response is acknowledged without
+being rewritten. Tools take the finished upload's id in an ``upload_id``
+form field in place of the file (see claim_upload).
+
+Each tool has its own size limit, for chunked and direct uploads alike
+(upload_limit); the app-wide MAX_CONTENT_LENGTH only covers other requests.
+"""
+from flask import Blueprint, jsonify, request
+from flask_login import current_user, login_required
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import wraps
+from werkzeug.utils import secure_filename
+import os
+import fcntl
+import hashlib
+import secrets
+import sqlite3
+import threading
+import time
+
+uploads_bp = Blueprint("uploads_bp", __name__)
+
+# CONFIG
+DB_PATH = "users.db"
+UPLOAD_SESSION_FOLDER = os.path.abspath(os.path.join("uploads", "sessions"))
+CHUNK_SIZE = int(float(os.environ.get("UPLOAD_CHUNK_MB", 8)) * 1024 * 1024)
+UPLOAD_TTL_HOURS = float(os.environ.get("UPLOAD_TTL_HOURS", 24))
+SWEEP_INTERVAL_SECONDS = int(os.environ.get("UPLOAD_SWEEP_SECONDS", 1800))
+
+def _mb(var, default):
+    return int(float(os.environ.get(var, default)) * 1024 * 1024)
+
+# Largest file each tool accepts, however it is uploaded
+TOOL_MAX_BYTES = {
+    "summarizer": _mb("SUMMARIZER_MAX_MB", 100),
+    "pdf_to_audio": _mb("PDF_TO_AUDIO_MAX_MB", 100),
+    "video_summarizer": _mb("VIDEO_MAX_MB", 2048),
+}
+# Room for the multipart envelope and the other form fields
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Running hash per session in this process: upload_id -> (bytes hashed, sha256 object).
+# Sessions whose chunks went to more than one worker are marked full_hash instead.
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+def get_conn():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_uploads_db(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            tool TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            chunk_size INTEGER NOT NULL,
+            received INTEGER NOT NULL DEFAULT 0,
+            sha256 TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    # 1 once some chunk was written without the running hash: complete_upload hashes the whole file
+    columns = [r[1] for r in conn.execute("PRAGMA table_info(upload_sessions)")]
+    if "full_hash" not in columns:
+        conn.execute("ALTER TABLE upload_sessions ADD COLUMN full_hash INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_sessions_updated ON upload_sessions(updated_at)")
+    conn.commit()
+    os.makedirs(UPLOAD_SESSION_FOLDER, exist_ok=True)
+
+def session_path(upload_id):
+    return os.path.join(UPLOAD_SESSION_FOLDER, upload_id + ".part")
+
+def upload_limit(tool):
+    """Route decorator: accept request bodies up to the tool's file limit."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            # The form is parsed lazily, so this still applies to request.files
+            request.max_content_length = TOOL_MAX_BYTES[tool] + FORM_OVERHEAD_BYTES
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _status(row):
+    return {
+        "upload_id": row["id"],
+        "tool": row["tool"],
+        "filename": row["filename"],
+        "size": row["size"],
+        "chunk_size": row["chunk_size"],
+        "received": row["received"],
+        "next_chunk": row["received"] // row["chunk_size"],
+        "chunks": -(-row["size"] // row["chunk_size"]),
+        "complete": row["sha256"] is not None,
+        "sha256": row["sha256"],
+    }
+
+def _own_session(conn, upload_id):
+    row = conn.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+    if row is None or row["user_id"] != current_user.id:
+        return None
+    return row
+
+@contextmanager
+def _locked_session_file(upload_id):
+    """The session's file, open for writing and flock'ed against every worker process.
+
+    Raises FileNotFoundError once the session was claimed or deleted.
+    """
+    with open(session_path(upload_id), "r+b") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield f  # the lock goes with the file
+
+def _forget(upload_id):
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+
+def _hasher(upload_id, received):
+    """Copy of this process's running sha256 of the first received bytes, or None if it has none."""
+    if received == 0:
+        return hashlib.sha256()
+    with _hashers_lock:
+        state = _hashers.get(upload_id)
+    if state is not None and state[0] == received:
+        return state[1].copy()
+    return None
+
+def _file_sha256(f):
+    h = hashlib.sha256()
+    f.seek(0)
+    for block in iter(lambda: f.read(1024 * 1024), b""):
+        h.update(block)
+    return h.hexdigest()
+
+# ----------------- Tools -----------------
+def claim_upload(upload_id, user_id, tool, dest_dir):
+    """Hand a completed upload over to a tool.
+
+    Moves the file into dest_dir and ends the session. Returns
+    {"path", "filename", "size", "sha256"}, or None if the upload is not
+    this user's, belongs to another tool or is unfinished.
+    """
+    conn = get_conn()
+    try:
+        row = conn.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+        if row is None or row["user_id"] != user_id or row["tool"] != tool or row["sha256"] is None:
+            return None
+        with conn:
+            # Only one request gets to claim it
+            if conn.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,)).rowcount != 1:
+                return None
+    finally:
+        conn.close()
+    _forget(upload_id)
+    path = os.path.join(dest_dir, f"{os.urandom(8).hex()}_{row['filename']}")
+    os.replace(session_path(upload_id), path)
+    return {"path": path, "filename": row["filename"], "size": row["size"], "sha256": row["sha256"]}
+
+def sweep_uploads(now=None):
+    """Drop sessions nobody touched for UPLOAD_TTL_HOURS; returns how many were removed."""
+    cutoff = ((now or datetime.utcnow()) - timedelta(hours=UPLOAD_TTL_HOURS)).isoformat()
+    conn = get_conn()
+    try:
+        ids = [r["id"] for r in conn.execute("SELECT id FROM upload_sessions WHERE updated_at < ?", (cutoff,))]
+        with conn:
+            conn.executemany("DELETE FROM upload_sessions WHERE id = ?", [(i,) for i in ids])
+    finally:
+        conn.close()
+    for upload_id in ids:
+        _forget(upload_id)
+        try:
+            os.remove(session_path(upload_id))
+        except OSError:
+            pass
+    return len(ids)
+
+def start_upload_sweeper(interval=SWEEP_INTERVAL_SECONDS):
+    def loop():
+        while True:
+            try:
+                removed = sweep_uploads()
+                if removed:
+                    print(f"[INFO] Upload sweep removed {removed} abandoned sessions")
+            except Exception as e:
+                print("[WARN] Upload sweep failed:", e)
+            time.sleep(interval)
+    threading.Thread(target=loop, daemon=True, name="upload-sweeper").start()
+
+# ----------------- Routes -----------------
+@uploads_bp.route("/uploads", methods=["POST"])
+@login_required
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    tool = data.get("tool")
+    if tool not in TOOL_MAX_BYTES:
+        return jsonify({"error": f"tool must be one of {', '.join(TOOL_MAX_BYTES)}"}), 400
+    try:
+        size = int(data.get("size"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "size (bytes) is required"}), 400
+    if size <= 0:
+        return jsonify({"error": "File is empty"}), 400
+    if size > TOOL_MAX_BYTES[tool]:
+        return jsonify({"error": f"File too large for {tool}", "max_bytes": TOOL_MAX_BYTES[tool]}), 413
+    filename = secure_filename(data.get("filename") or "") or "upload"
+
+    upload_id = secrets.token_urlsafe(18)
+    open(session_path(upload_id), "wb").close()
+    now = datetime.utcnow().isoformat()
+    conn = get_conn()
+    with conn:
+        conn.execute('''
+            INSERT INTO upload_sessions (id, user_id, tool, filename, size, chunk_size, received, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)
+        ''', (upload_id, current_user.id, tool, filename, size, CHUNK_SIZE, now, now))
+        row = conn.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+    conn.close()
+    return jsonify(dict(_status(row), upload_url=f"/uploads/{upload_id}")), 201
+
+@uploads_bp.route("/uploads/<upload_id>")
+@login_required
+def upload_status(upload_id):
+    conn = get_conn()
+    try:
+        row = _own_session(conn, upload_id)
+    finally:
+        conn.close()
+    if row is None:
+        return jsonify({"error": "Unknown upload"}), 404
+    return jsonify(_status(row))
+
+@uploads_bp.route("/uploads/<upload_id>/chunks/<int:index>", methods=["PUT"])
+@login_required
+def put_chunk(upload_id, index):
+    conn = get_conn()
+    try:
+        row = _own_session(conn, upload_id)
+        if row is None:
+            return jsonify({"error": "Unknown upload"}), 404
+        if row["sha256"] is not None:
+            return jsonify(_status(row))
+        offset = index * row["chunk_size"]
+        expected = min(row["chunk_size"], row["size"] - offset)
+        if offset < row["received"]:
+            # Resent after a lost response; already stored
+            return jsonify(_status(row))
+        if offset > row["received"] or expected <= 0:
+            return jsonify(dict(_status(row), error="Chunks must be sent in order")), 409
+        request.max_content_length = row["chunk_size"]
+        if request.content_length is not None and request.content_length != expected:
+            return jsonify({"error": f"Chunk {index} must be {expected} bytes"}), 400
+
+        try:
+            with _locked_session_file(upload_id) as f:
+                row = conn.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+                if row is None:
+                    return jsonify({"error": "Unknown upload"}), 404
+                if row["received"] > offset:
+                    # A retry of this chunk was stored by another request meanwhile
+                    return jsonify(_status(row))
+                if row["received"] < offset:
+                    return jsonify(dict(_status(row), error="Chunks must be sent in order")), 409
+                # Without this process's running hash, skip hashing: complete_upload hashes the file once
+                h = None if row["full_hash"] else _hasher(upload_id, offset)
+                # Read the body straight off the socket into the file, hashing as it goes
+                written = 0
+                f.seek(offset)
+                while written < expected:
+                    block = request.stream.read(min(1024 * 1024, expected - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    if h is not None:
+                        h.update(block)
+                    written += len(block)
+                if written != expected or request.stream.read(1):
+                    f.truncate(offset)
+                    return jsonify(dict(_status(row), error=f"Chunk {index} must be {expected} bytes")), 400
+                f.flush()
+
+                with conn:
+                    conn.execute("UPDATE upload_sessions SET received = ?, full_hash = ?, updated_at = ? WHERE id = ?",
+                                 (offset + written, int(h is None), datetime.utcnow().isoformat(), upload_id))
+                with _hashers_lock:
+                    if h is None:
+                        _hashers.pop(upload_id, None)
+                    else:
+                        _hashers[upload_id] = (offset + written, h)
+        except FileNotFoundError:
+            return jsonify({"error": "Unknown upload"}), 404
+        row = conn.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+    finally:
+        conn.close()
+    return jsonify(_status(row))
+
+@uploads_bp.route("/uploads/<upload_id>/complete", methods=["POST"])
+@login_required
+def complete_upload(upload_id):
+    """Finish the upload; an optional "sha256" in the body is checked against what arrived.
+
+    On a mismatch the received bytes are dropped and the upload starts over from chunk 0.
+    """
+    expected = ((request.get_json(silent=True) or {}).get("sha256") or "").lower()
+    conn = get_conn()
+    try:
+        row = _own_session(conn, upload_id)
+        if row is None:
+            return jsonify({"error": "Unknown upload"}), 404
+        if row["sha256"] is not None:
+            if expected and expected != row["sha256"]:
+                return jsonify(dict(_status(row), error="Checksum mismatch")), 422
+            return jsonify(_status(row))
+        if row["received"] != row["size"]:
+            return jsonify(dict(_status(row), error="Upload is incomplete")), 409
+
+        try:
+            with _locked_session_file(upload_id) as f:
+                h = None if row["full_hash"] else _hasher(upload_id, row["received"])
+                digest = h.hexdigest() if h is not None else _file_sha256(f)
+                _forget(upload_id)
+                now = datetime.utcnow().isoformat()
+                if expected and expected != digest:
+                    # Other workers may still hold running hashes of the old bytes
+                    with conn:
+                        conn.execute("UPDATE upload_sessions SET received = 0, full_hash = 1, updated_at = ? WHERE id = ?",
+                                     (now, upload_id))
+                    f.truncate(0)
+                    row = conn.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+                    return jsonify(dict(_status(row), error="Checksum mismatch")), 422
+                with conn:
+                    conn.execute("UPDATE upload_sessions SET sha256 = ?, updated_at = ? WHERE id = ?",
+                                 (digest, now, upload_id))
+        except FileNotFoundError:
+            return jsonify({"error": "Unknown upload"}), 404
+        row = conn.execute("SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)).fetchone()
+    finally:
+        conn.close()
+    return jsonify(_status(row))
+
+@uploads_bp.route("/uploads/<upload_id>", methods=["DELETE"])
+@login_required
+def delete_upload(upload_id):
+    conn = get_conn()
+    try:
+        if _own_session(conn, upload_id) is None:
+            return jsonify({"error": "Unknown upload"}), 404
+        with conn:
+            conn.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+    finally:
+        conn.close()
+    _forget(upload_id)
+    try:
+        os.remove(session_path(upload_id))
+    except OSError:
+        pass
+    return jsonify({"status": "deleted", "upload_id": upload_id})
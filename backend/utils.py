@@ -1,9 +1,62 @@
+import os
+import json
 import sqlite3
 from datetime import datetime
-from flask import current_app
+from functools import wraps
+from flask import current_app, jsonify
+from flask_login import current_user
 
 DB_PATH = "users.db"
 
+# Comma-separated list of admin accounts, e.g. ADMIN_EMAILS="ops@example.com,me@example.com"
+ADMIN_EMAILS = {e.strip().lower() for e in os.environ.get("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+def is_admin():
+    """True when the logged-in user is listed in ADMIN_EMAILS."""
+    return bool(getattr(current_user, "is_authenticated", False)) and \
+        getattr(current_user, "email", "").lower() in ADMIN_EMAILS
+
+# Instructors may run cohort tools; admins are always instructors too
+INSTRUCTOR_EMAILS = {e.strip().lower() for e in os.environ.get("INSTRUCTOR_EMAILS", "").split(",") if e.strip()}
+
+def is_instructor():
+    return is_admin() or (bool(getattr(current_user, "is_authenticated", False)) and
+                          getattr(current_user, "email", "").lower() in INSTRUCTOR_EMAILS)
+
+def admin_required(view):
+    """Restrict a route to admin accounts."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin():
+            return jsonify({"error": "Admin access required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def instructor_required(view):
+    """Restrict a route to instructor (or admin) accounts."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_instructor():
+            return jsonify({"error": "Instructor access required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def _counter_column(tool_name):
+    tool_name_lower = tool_name.lower()
+    if "pdf" in tool_name_lower and "audio" not in tool_name_lower:
+        return "summarizer_count"
+    elif "pdf" in tool_name_lower and "audio" in tool_name_lower:
+        return "audio_count"
+    elif "quiz" in tool_name_lower:
+        return "quiz_count"
+    elif "video" in tool_name_lower:
+        return "video_count"
+    elif "flashcards" in tool_name_lower:
+        return "flashcards_count"
+    elif "study_planner" in tool_name_lower or "adaptive study planner" in tool_name_lower:
+        return "study_planner_count"
+    return None
+
 def record_tool_usage(user_id, tool_name):
     """Record a tool usage in the tool_usage table and update counters."""
     try:
@@ -17,19 +70,9 @@ def record_tool_usage(user_id, tool_name):
         conn.commit()
 
         # Increment usage counters in users table
-        tool_name_lower = tool_name.lower()
-        if "pdf" in tool_name_lower and "audio" not in tool_name_lower:
-            cur.execute("UPDATE users SET summarizer_count = COALESCE(summarizer_count,0)+1 WHERE id=?", (user_id,))
-        elif "pdf" in tool_name_lower and "audio" in tool_name_lower:
-            cur.execute("UPDATE users SET audio_count = COALESCE(audio_count,0)+1 WHERE id=?", (user_id,))
-        elif "quiz" in tool_name_lower:
-            cur.execute("UPDATE users SET quiz_count = COALESCE(quiz_count,0)+1 WHERE id=?", (user_id,))
-        elif "video" in tool_name_lower:
-            cur.execute("UPDATE users SET video_count = COALESCE(video_count,0)+1 WHERE id=?", (user_id,))
-        elif "flashcards" in tool_name_lower:
-            cur.execute("UPDATE users SET flashcards_count = COALESCE(flashcards_count,0)+1 WHERE id=?", (user_id,))
-        elif "study_planner" in tool_name_lower or "adaptive study planner" in tool_name_lower:
-            cur.execute("UPDATE users SET study_planner_count = COALESCE(study_planner_count,0)+1 WHERE id=?", (user_id,))
+        column = _counter_column(tool_name)
+        if column:
+            cur.execute(f"UPDATE users SET {column} = COALESCE({column},0)+1 WHERE id=?", (user_id,))
 
         conn.commit()
         conn.close()
@@ -37,3 +80,27 @@ def record_tool_usage(user_id, tool_name):
 
     except Exception as e:
         print("Error recording tool usage:", e)
+
+def record_tool_usage_many(user_ids, tool_name):
+    """Record one usage for each user in a single transaction (batched insert + counter update)."""
+    if not user_ids:
+        return
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        ts = datetime.utcnow().isoformat()
+        column = _counter_column(tool_name)
+        with conn:
+            conn.executemany("INSERT INTO tool_usage (user_id, tool_name, ts) VALUES (?, ?, ?)",
+                             [(uid, tool_name, ts) for uid in user_ids])
+            if column:
+                # One statement for all counters; a user listed twice is counted twice
+                ids = json.dumps(list(user_ids))
+                conn.execute(f"""
+                    UPDATE users SET {column} = COALESCE({column},0) +
+                        (SELECT COUNT(*) FROM json_each(?) WHERE value = users.id)
+                    WHERE id IN (SELECT value FROM json_each(?))
+                """, (ids, ids))
+        conn.close()
+        print(f"[INFO] Tool usage recorded: {tool_name} for {len(user_ids)} users")
+    except Exception as e:
+        print("Error recording tool usage:", e)
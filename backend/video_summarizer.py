@@ -1,8 +1,16 @@
 # video_summarizer.py
-from flask import Blueprint, render_template, request, send_file
+from flask import Blueprint, render_template, request, jsonify, Response, stream_with_context
 import os
+import json
+import shutil
 import subprocess
 import tempfile
+import numpy as np
+from bisect import bisect_right
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_all_start_methods, get_context
 import yt_dlp
 from nltk.tokenize import sent_tokenize
 from flask_login import current_user, login_required
@@ -10,99 +18,382 @@ from werkzeug.utils import secure_filename
 import whisper
 from transformers import pipeline
 from utils import record_tool_usage
+import transcript_cache
+import transcribe_worker
+from artifacts import create_artifact, send_artifact
+import admission
+import progress
+from uploads import claim_upload, upload_limit
 
 # CONFIG
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-FFMPEG_PATH = r"C:\ffmpeg-8.0-full_build\ffmpeg-8.0-full_build\bin\ffmpeg.exe"
-os.environ["IMAGEIO_FFMPEG_EXE"] = FFMPEG_PATH
+# Set FFMPEG_PATH to override discovery on PATH
+FFMPEG_PATH = os.environ.get("FFMPEG_PATH") or shutil.which("ffmpeg") or "ffmpeg"
+os.environ.setdefault("IMAGEIO_FFMPEG_EXE", FFMPEG_PATH)
+SAMPLE_RATE = 16000
+
+# Long audio is cut near every SEGMENT_SECONDS (at the quietest point) and transcribed in parallel
+SEGMENT_SECONDS = int(os.environ.get("VIDEO_SEGMENT_SECONDS", 120))
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+_pool = None
+_pool_lock = threading.Lock()
+
+# YouTube ingestion: "audio" streams the smallest audio-only format into ffmpeg, "video" downloads mp4 first
+YT_INGEST_MODE = os.environ.get("YT_INGEST_MODE", "audio")
+YT_AUDIO_FORMAT = os.environ.get("YT_AUDIO_FORMAT", "worstaudio[vcodec=none]/bestaudio/worstaudio")
+YT_MAX_DURATION_SECONDS = int(os.environ.get("YT_MAX_DURATION_SECONDS", 4 * 3600))
+YT_MAX_BYTES = int(float(os.environ.get("YT_MAX_MB", 500)) * 1024 * 1024)
+
+# Energy/zero-crossing voice activity detection drops silence and dead air before Whisper
+VAD_ENABLED = os.environ.get("VIDEO_VAD", "1") != "0"
+# Keep the whole recording when VAD would keep less than this fraction of it
+VAD_MIN_KEEP = float(os.environ.get("VIDEO_VAD_MIN_KEEP", 0.05))
 
 video_bp = Blueprint("video_summarizer", __name__)
 
 # Models (load once)
-whisper_model = whisper.load_model("small")
+WHISPER_MODEL = "small"
+whisper_model = whisper.load_model(WHISPER_MODEL)
 summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
 
-def extract_audio(video_path):
-    audio_path = os.path.join(UPLOAD_FOLDER, "temp_audio.wav")
-    cmd = [FFMPEG_PATH, "-i", video_path, "-ac", "1", "-ar", "16000", audio_path, "-y"]
-    subprocess.run(cmd, check=True)
-    return audio_path
+def extract_audio(source, headers=None, max_seconds=None):
+    """Decode the audio track to 16 kHz mono float32 PCM via an ffmpeg pipe (no temp WAV).
+
+    source may be a local file or a stream URL; headers are sent with HTTP requests.
+    max_seconds stops decoding there, so a stream can't fill memory.
+    """
+    cmd = [FFMPEG_PATH, "-nostdin"]
+    if headers:
+        cmd += ["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    cmd += ["-i", source, "-vn", "-f", "s16le",
+            "-ac", "1", "-ar", str(SAMPLE_RATE), "-loglevel", "error"]
+    if max_seconds:
+        cmd += ["-t", str(max_seconds)]
+    cmd += ["-"]
+    proc = subprocess.run(cmd, capture_output=True, check=True)
+    return np.frombuffer(proc.stdout, np.int16).astype(np.float32) / 32768.0
+
+def split_on_silence(audio, segment_seconds=SEGMENT_SECONDS, search_seconds=10, frame_ms=30):
+    """Return (start, end) sample spans of about segment_seconds, cut at low-energy frames."""
+    frame = SAMPLE_RATE * frame_ms // 1000
+    n_frames = len(audio) // frame
+    per_segment = segment_seconds * 1000 // frame_ms
+    if n_frames < per_segment * 1.5:
+        return [(0, len(audio))]
+
+    energy = np.sqrt(np.mean(audio[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+    window = search_seconds * 1000 // frame_ms
+    cuts = [0]
+    target = per_segment
+    while target < n_frames - per_segment // 2:
+        lo = max(cuts[-1] + 1, target - window)
+        hi = min(n_frames, target + window)
+        cut = lo + int(np.argmin(energy[lo:hi]))
+        cuts.append(cut)
+        target = cut + per_segment
+
+    bounds = [c * frame for c in cuts] + [len(audio)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _transcribe_segment(index, start, audio):
+    return transcribe_worker.transcribe_segment(index, start, audio, whisper_model)
+
+def _get_pool():
+    # Never forked from this threaded process once torch / OpenMP are running (see wsgi.py): workers
+    # come from a forkserver (spawn where there is none) and load their own model in transcribe_worker
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            threads = max(1, (os.cpu_count() or 1) // TRANSCRIBE_WORKERS)
+            method = "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=TRANSCRIBE_WORKERS, mp_context=get_context(method),
+                                        initializer=transcribe_worker.init_worker, initargs=(WHISPER_MODEL, threads))
+        return _pool
+
+def _discard_pool(pool):
+    """Drop a broken pool (a worker died, e.g. OOM-killed) so the next call starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def detect_speech(audio, frame_ms=30, min_silence_ms=600, pad_ms=200):
+    """Speech (start, end) sample spans from per-frame RMS energy and zero-crossing rate."""
+    frame = SAMPLE_RATE * frame_ms // 1000
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy = np.sqrt(np.mean(frames ** 2, axis=1))
+    zcr = np.mean(np.diff(np.signbit(frames), axis=1), axis=1)
+    # 3x the noise floor, but never above half the peak: with steady noise or speech
+    # that never pauses, the 10th percentile is itself speech level
+    peak = energy.max()
+    threshold = max(min(np.percentile(energy, 10) * 3, peak * 0.5), peak * 0.02, 1e-4)
+    voiced = np.flatnonzero((energy > threshold) & (zcr < 0.35))
+    if voiced.size == 0:
+        return []
+
+    # Bridge pauses shorter than min_silence_ms, then pad each region
+    gaps = np.flatnonzero(np.diff(voiced) > min_silence_ms // frame_ms)
+    starts = np.r_[voiced[0], voiced[gaps + 1]] - pad_ms // frame_ms
+    ends = np.r_[voiced[gaps], voiced[-1]] + 1 + pad_ms // frame_ms
 
-def transcribe_audio(audio_path):
-    res = whisper_model.transcribe(audio_path)
-    return res.get("text", "")
+    spans = []
+    for start, end in zip(np.maximum(starts, 0) * frame, np.minimum(ends, n_frames) * frame):
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], int(end))
+        else:
+            spans.append([int(start), int(end)])
+    if spans[-1][1] == n_frames * frame:
+        spans[-1][1] = len(audio)
+    return [tuple(s) for s in spans]
+
+def remove_silence(audio):
+    """Concatenate speech regions. Returns (speech, speech_map, stats).
+
+    speech_map is a list of (offset in speech, offset in original) sample pairs,
+    one per region, used to map transcript times back onto the original video.
+    """
+    total = len(audio) / SAMPLE_RATE
+    spans = detect_speech(audio) if VAD_ENABLED else [(0, len(audio))]
+    if sum(end - start for start, end in spans) < VAD_MIN_KEEP * len(audio):
+        # Almost nothing passed: more likely a misjudged noise floor than a silent video
+        spans = [(0, len(audio))] if len(audio) else []
+    speech_map = []
+    offset = 0
+    for start, end in spans:
+        speech_map.append((offset, start))
+        offset += end - start
+    speech = np.concatenate([audio[start:end] for start, end in spans]) if spans else audio[:0]
+    kept = len(speech) / SAMPLE_RATE
+    stats = {"total_seconds": round(total, 1), "speech_seconds": round(kept, 1),
+             "skipped_seconds": round(total - kept, 1)}
+    return speech, speech_map, stats
+
+def to_original_time(seconds, speech_map):
+    if not speech_map:
+        return seconds
+    pos = seconds * SAMPLE_RATE
+    i = max(bisect_right([m[0] for m in speech_map], pos) - 1, 0)
+    speech_offset, original_offset = speech_map[i]
+    return round((original_offset + pos - speech_offset) / SAMPLE_RATE, 2)
+
+def _remap(part, speech_map):
+    part["start"] = to_original_time(part["start"], speech_map)
+    for seg in part["segments"]:
+        seg["start"] = to_original_time(seg["start"], speech_map)
+        seg["end"] = to_original_time(seg["end"], speech_map)
+    return part
+
+def transcribe_segments(speech, speech_map=None):
+    """Yield per-segment results as they finish (not necessarily in order).
+
+    Times are mapped back through speech_map when the audio had silence removed.
+    """
+    if len(speech) == 0:
+        return
+    spans = split_on_silence(speech)
+    if len(spans) == 1 or TRANSCRIBE_WORKERS <= 1:
+        for i, (start, end) in enumerate(spans):
+            yield dict(_remap(_transcribe_segment(i, start, speech[start:end]), speech_map), total=len(spans))
+        return
+    pending = dict(enumerate(spans))
+    for attempt in range(2):
+        pool = _get_pool()
+        try:
+            futures = [pool.submit(transcribe_worker.transcribe_segment, i, start, speech[start:end])
+                       for i, (start, end) in pending.items()]
+            for f in as_completed(futures):
+                result = f.result()
+                del pending[result["index"]]
+                yield dict(_remap(result, speech_map), total=len(spans))
+            return
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            if attempt:
+                raise
+            # Retry once on a fresh pool, only the segments not finished yet
+            print(f"[WARN] Transcription pool broke, retrying {len(pending)} segments")
+
+def transcribe_audio(audio, report=None):
+    """Full transcript and timestamped segments, stitched back in order.
+
+    report(stage, percent, **fields) is called as segments finish.
+    """
+    speech, speech_map, stats = remove_silence(audio)
+    print(f"[INFO] VAD kept {stats['speech_seconds']}s of {stats['total_seconds']}s "
+          f"(skipped {stats['skipped_seconds']}s)")
+    if report:
+        report("transcribing", 10, vad=stats)
+    parts = []
+    for part in transcribe_segments(speech, speech_map):
+        parts.append(part)
+        if report:
+            report("transcribing", 10 + int(80 * len(parts) / part["total"]),
+                   segments_done=len(parts), segments_total=part["total"])
+    parts.sort(key=lambda p: p["index"])
+    text = " ".join(p["text"] for p in parts if p["text"])
+    segments = [seg for p in parts for seg in p["segments"]]
+    return text, segments
 
 def summarize_text(text, max_lines=25):
     sentences = sent_tokenize(text)
     return " ".join(sentences[:max_lines])
 
-def download_youtube_video(video_link):
-    video_path = os.path.join(UPLOAD_FOLDER, "yt_video.mp4")
+def download_youtube_video(video_link, workdir, ydl_cls=None):
+    video_path = os.path.join(workdir, "yt_video.mp4")
     ydl_opts = {"outtmpl": video_path, "format": "mp4/best", "quiet": True}
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    with (ydl_cls or yt_dlp.YoutubeDL)(ydl_opts) as ydl:
         ydl.extract_info(video_link, download=True)
     return video_path
 
+def resolve_youtube_audio(video_link, ydl_cls=None):
+    """Pick the smallest audio-only stream without downloading anything.
+
+    Returns (stream_url, http_headers). Raises ValueError for live streams,
+    videos of unknown length or longer than YT_MAX_DURATION_SECONDS, and
+    streams larger than YT_MAX_BYTES.
+    ydl_cls defaults to yt_dlp.YoutubeDL; any class with the same
+    context-manager / extract_info interface can stand in for it offline.
+    """
+    ydl_opts = {"format": YT_AUDIO_FORMAT, "quiet": True, "noplaylist": True}
+    with (ydl_cls or yt_dlp.YoutubeDL)(ydl_opts) as ydl:
+        info = ydl.extract_info(video_link, download=False)
+
+    if info.get("is_live") or info.get("live_status") in ("is_live", "is_upcoming"):
+        raise ValueError("Live streams can't be summarized; try again once the recording is available.")
+    duration = info.get("duration")
+    if not duration:
+        raise ValueError("Video length is unknown, so it can't be checked against the limit.")
+    duration = int(duration)
+    if duration > YT_MAX_DURATION_SECONDS:
+        raise ValueError(f"Video is {duration // 60} min long; the limit is {YT_MAX_DURATION_SECONDS // 60} min.")
+    fmt = info
+    if "url" not in info:
+        # Some extractors return the selection as requested_formats; keep the audio-only one
+        fmt = next((f for f in info.get("requested_formats", []) if f.get("vcodec") in (None, "none")), {})
+    size = fmt.get("filesize") or fmt.get("filesize_approx") or 0
+    if size > YT_MAX_BYTES:
+        raise ValueError(f"Audio stream is {size // (1024 * 1024)} MB; the limit is {YT_MAX_BYTES // (1024 * 1024)} MB.")
+    if not fmt.get("url"):
+        raise ValueError("No audio-only stream available for this video.")
+    return fmt["url"], fmt.get("http_headers") or info.get("http_headers") or {}
+
+def load_youtube_audio(video_link, workdir, ydl_cls=None):
+    """PCM audio for a YouTube link using the configured ingestion mode."""
+    if YT_INGEST_MODE == "video":
+        return extract_audio(download_youtube_video(video_link, workdir, ydl_cls),
+                             max_seconds=YT_MAX_DURATION_SECONDS)
+    # -t is the hard cap: a stream's size is not always known up front
+    return extract_audio(*resolve_youtube_audio(video_link, ydl_cls), max_seconds=YT_MAX_DURATION_SECONDS)
+
+def prepare_video_input(workdir):
+    """Return (cache_key, video_path, link), or None if nothing was submitted.
+
+    Uploads are saved into workdir and hashed (chunked uploads, sent as
+    upload_id, arrive hashed already); links are only parsed, so a cache
+    hit never downloads anything.
+    """
+    upload_id = request.form.get("upload_id")
+    video_file = request.files.get("video_file")
+    video_link = request.form.get("video_link")
+    if upload_id:
+        upload = claim_upload(upload_id, current_user.id, "video_summarizer", workdir)
+        if upload is None:
+            raise ValueError("Unknown or unfinished upload")
+        return "sha256:" + upload["sha256"], upload["path"], None
+    if video_file and video_file.filename:
+        safe_name = secure_filename(video_file.filename) or "upload"
+        video_path = os.path.join(workdir, safe_name)
+        video_file.save(video_path)
+        return transcript_cache.file_key(video_path), video_path, None
+    if video_link:
+        video_id = transcript_cache.parse_youtube_id(video_link)
+        if video_id:
+            return f"yt:{video_id}", None, f"https://www.youtube.com/watch?v={video_id}"
+        return None, None, video_link.strip()
+    return None
+
+def load_transcript(key, video_path, link, workdir, report=None):
+    """Cached (transcript, segments, summaries) for key, else download/extract/transcribe and cache."""
+    cached = transcript_cache.get(key)
+    if cached:
+        print(f"[INFO] Transcript cache hit: {key}")
+        return cached["transcript"], cached["segments"], cached["summaries"]
+    if report:
+        report("extracting", 2)
+    audio = extract_audio(video_path) if video_path else load_youtube_audio(link, workdir)
+    transcript, segments = transcribe_audio(audio, report)
+    transcript_cache.put(key, transcript, segments)
+    return transcript, segments, {}
+
+def cached_summary(key, transcript, summaries, summary_length):
+    summary = summaries.get(str(summary_length))
+    if summary is None:
+        summary = summarize_text(transcript, max_lines=summary_length)
+        transcript_cache.add_summary(key, summary_length, summary)
+    return summary
+
+def record_video_usage():
+    # Record usage (only if user is authenticated)
+    try:
+        if current_user and getattr(current_user, "is_authenticated", False):
+            record_tool_usage(current_user.id, "Video Summarizer")
+        else:
+            print("[WARN] Not recording usage: user not authenticated.")
+    except Exception as e:
+        print("[WARN] record_tool_usage failed:", e)
+
+def get_summary_length():
+    try:
+        return min(int(request.form.get("summary_length", 25)), 25)
+    except:
+        return 25
+
 @video_bp.route("/video_summarizer", methods=["GET", "POST"])
 @login_required
+@upload_limit("video_summarizer")
 def video_summarizer():
     transcript = summary = error = None
     summary_file_path = None
 
     if request.method == "POST":
-        video_file = request.files.get("video_file")
-        video_link = request.form.get("video_link")
+        summary_length = get_summary_length()
         try:
-            summary_length = min(int(request.form.get("summary_length", 25)), 25)
-        except:
-            summary_length = 25
+            # Whisper runs on the "video" gate, shared with background jobs and streams
+            ticket = admission.gate("video").acquire(current_user.id)
+        except admission.Overloaded as e:
+            return render_template("video_summarizer.html", error=f"⏳ {e}"), 429, {"Retry-After": str(e.retry_after)}
 
-        video_path = None
+        # Each job gets its own workspace so concurrent requests never share files
+        workdir = tempfile.mkdtemp(prefix="video_", dir=UPLOAD_FOLDER)
         try:
-            # Save or download video
-            if video_file and video_file.filename:
-                safe_name = secure_filename(video_file.filename)
-                video_path = os.path.join(UPLOAD_FOLDER, safe_name)
-                video_file.save(video_path)
-            elif video_link:
-                clean_link = video_link.split("&")[0].split("?si=")[0]
-                video_path = download_youtube_video(clean_link)
-            else:
+            video_input = prepare_video_input(workdir)
+            if video_input is None:
                 error = "Please upload a video or provide a YouTube link."
                 return render_template("video_summarizer.html", error=error)
 
-            # Extract -> Transcribe -> Summarize
-            audio_path = extract_audio(video_path)
-            transcript = transcribe_audio(audio_path)
-            summary = summarize_text(transcript, max_lines=summary_length)
-
-            # Save summary to temp file for download
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".txt")
-            tmp.write(summary.encode("utf-8"))
-            tmp.close()
-            summary_file_path = tmp.name
-
-            # Cleanup extracted files (best-effort)
-            for f in (audio_path, video_path):
-                try:
-                    if f and os.path.exists(f):
-                        os.remove(f)
-                except Exception as ee:
-                    print("[WARN] cleanup failed:", ee)
-
-            # Record usage (only if user is authenticated)
-            try:
-                if current_user and getattr(current_user, "is_authenticated", False):
-                    record_tool_usage(current_user.id, "Video Summarizer")
-                else:
-                    print("[WARN] Not recording usage: user not authenticated.")
-            except Exception as e:
-                print("[WARN] record_tool_usage failed:", e)
+            # (Cache or Extract -> Transcribe) -> Summarize
+            key, video_path, link = video_input
+            transcript, _, summaries = load_transcript(key, video_path, link, workdir)
+            summary = cached_summary(key, transcript, summaries, summary_length)
+
+            # Save summary to the artifact store for download
+            summary_file_path = create_artifact(current_user.id, "video_summary", "summary.txt",
+                                                "text/plain; charset=utf-8", summary)
+
+            record_video_usage()
 
         except Exception as e:
             error = f"❌ Error: {e}"
+        finally:
+            admission.gate("video").release(ticket)
+            shutil.rmtree(workdir, ignore_errors=True)
 
     return render_template(
         "video_summarizer.html",
@@ -112,9 +403,143 @@ def video_summarizer():
         summary_file=summary_file_path
     )
 
-@video_bp.route("/download_summary/<path:file_path>")
+def run_video_job(job_id, user_id, video_input, workdir, summary_length):
+    """Background pipeline behind /video_summarizer/jobs; every stage is published to the progress bus."""
+    def report(stage, percent, **fields):
+        progress.publish(job_id, state="running", stage=stage, progress=percent, **fields)
+
+    try:
+        key, video_path, link = video_input
+        transcript, segments, summaries = load_transcript(key, video_path, link, workdir, report)
+        report("summarizing", 92)
+        summary = cached_summary(key, transcript, summaries, summary_length)
+        summary_id = create_artifact(user_id, "video_summary", "summary.txt", "text/plain; charset=utf-8", summary)
+        record_tool_usage(user_id, "Video Summarizer")
+        progress.publish(job_id, state="done", stage="done", progress=100, transcript=transcript,
+                         summary=summary, summary_url=f"/download_summary/{summary_id}")
+    except Exception as e:
+        print("[ERROR] Video job failed:", e)
+        progress.fail(job_id, e)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+@video_bp.route("/video_summarizer/jobs", methods=["POST"])
+@login_required
+@upload_limit("video_summarizer")
+def start_video_job():
+    """Same inputs as /video_summarizer; returns a job to follow on the progress bus."""
+    # Turn away before reading the upload when the queue can't take it
+    admission.check("video", current_user.id)
+    summary_length = get_summary_length()
+    workdir = tempfile.mkdtemp(prefix="video_", dir=UPLOAD_FOLDER)
+    try:
+        video_input = prepare_video_input(workdir)
+    except Exception as e:
+        shutil.rmtree(workdir, ignore_errors=True)
+        return jsonify({"error": str(e)}), 400
+    if video_input is None:
+        shutil.rmtree(workdir, ignore_errors=True)
+        return jsonify({"error": "Please upload a video or provide a YouTube link."}), 400
+
+    job_id = progress.create_job(current_user.id, "Video Summarizer")
+    try:
+        admission.submit("video", current_user.id, run_video_job, job_id, current_user.id, video_input, workdir,
+                         summary_length)
+    except admission.Overloaded:
+        progress.discard(job_id)
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    return jsonify(progress.job_urls(job_id)), 202
+
+@video_bp.route("/video_summarizer/stream", methods=["POST"])
+@login_required
+@upload_limit("video_summarizer")
+def video_summarizer_stream():
+    """Same inputs as /video_summarizer, streamed back as NDJSON events while segments finish.
+
+    {"type": "segment", "index", "total", "start", "text", "segments"}  one per finished segment
+    {"type": "summary", "upto", "summary"}                      summary of the in-order prefix so far
+    {"type": "done", "transcript", "segments", "summary"}       final stitched result
+
+    The stream holds a "video" gate slot until it closes.
+    """
+    summary_length = get_summary_length()
+    gate = admission.gate("video")
+    ticket = gate.acquire(current_user.id)
+    workdir = tempfile.mkdtemp(prefix="video_", dir=UPLOAD_FOLDER)
+    try:
+        video_input = prepare_video_input(workdir)
+    except Exception as e:
+        gate.release(ticket)
+        shutil.rmtree(workdir, ignore_errors=True)
+        return jsonify({"error": str(e)}), 400
+    if video_input is None:
+        gate.release(ticket)
+        shutil.rmtree(workdir, ignore_errors=True)
+        return jsonify({"error": "Please upload a video or provide a YouTube link."}), 400
+
+    def event(data):
+        return json.dumps(data) + "\n"
+
+    key, video_path, link = video_input
+
+    def generate():
+        try:
+            cached = transcript_cache.get(key)
+            if cached:
+                yield event({
+                    "type": "done",
+                    "transcript": cached["transcript"],
+                    "segments": cached["segments"],
+                    "summary": cached_summary(key, cached["transcript"], cached["summaries"], summary_length),
+                    "cached": True
+                })
+                record_video_usage()
+                return
+
+            audio = extract_audio(video_path) if video_path else load_youtube_audio(link, workdir)
+            speech, speech_map, stats = remove_silence(audio)
+            yield event(dict(stats, type="vad"))
+
+            parts = {}
+            next_index = 0
+            for part in transcribe_segments(speech, speech_map):
+                parts[part["index"]] = part
+                yield event(dict(part, type="segment"))
+                # Re-summarize only when the contiguous prefix grows
+                if part["index"] == next_index:
+                    while next_index in parts:
+                        next_index += 1
+                    prefix = " ".join(parts[i]["text"] for i in range(next_index))
+                    yield event({"type": "summary", "upto": next_index,
+                                 "summary": summarize_text(prefix, max_lines=summary_length)})
+
+            ordered = [parts[i] for i in sorted(parts)]
+            transcript = " ".join(p["text"] for p in ordered if p["text"])
+            segments = [seg for p in ordered for seg in p["segments"]]
+            transcript_cache.put(key, transcript, segments)
+            yield event({
+                "type": "done",
+                "transcript": transcript,
+                "segments": segments,
+                "summary": cached_summary(key, transcript, {}, summary_length)
+            })
+            record_video_usage()
+        except Exception as e:
+            yield event({"type": "error", "error": str(e)})
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                        headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
+    # Runs even if the client goes away before the stream starts, when the generator's finally never does
+    def close():
+        gate.release(ticket)
+        shutil.rmtree(workdir, ignore_errors=True)
+    response.call_on_close(close)
+    return response
+
+@video_bp.route("/download_summary/<artifact_id>")
 @login_required
-def download_summary(file_path):
-    if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True, download_name="summary.txt")
-    return "File not found", 404
+def download_summary(artifact_id):
+    return send_artifact(artifact_id, as_attachment=True)
@@ -0,0 +1,61 @@
+"""Production entry point for a pre-fork WSGI server.
+
+    gunicorn wsgi:app            (settings in gunicorn.conf.py)
+
+Importing this module loads everything read-only and expensive: the BART
+and Whisper weights (imported by the tool modules), NLTK data and the
+resource index. With preload_app the master does this once and the
+workers forked from it share those pages copy-on-write instead of each
+loading several GB of weights. Every worker then calls init_worker() to
+size its torch / BLAS thread pools and, in exactly one worker, start the
+maintenance threads.
+"""
+import os
+
+# torch / BLAS threads per worker; gunicorn.conf.py splits the cores between workers
+TORCH_THREADS = int(os.environ.get("TORCH_THREADS", 1))
+# OpenMP and BLAS size their pools when first loaded, so this has to run before numpy / torch are imported
+for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+    os.environ.setdefault(var, str(TORCH_THREADS))
+
+import fcntl
+import gc
+
+import torch
+
+# Keep the master single-threaded: an OpenMP pool started before fork can hang the workers
+torch.set_num_threads(1)
+
+from nltk.tokenize import sent_tokenize
+
+import resource_index
+from app import create_app, start_background_jobs
+
+# Held open by the one worker that runs the maintenance threads
+LEADER_LOCK_PATH = os.environ.get("LEADER_LOCK_PATH", "background.lock")
+_leader_lock = None
+
+def preload():
+    """Load shared read-only state that the tool modules would otherwise load on first use."""
+    sent_tokenize("Warm up the tokenizer. It is cached after this.")
+    resource_index.get_index()
+
+def init_worker():
+    """Per-worker setup, called right after fork."""
+    global _leader_lock
+    torch.set_num_threads(TORCH_THREADS)
+    lock = open(LEADER_LOCK_PATH, "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return
+    # The lock dies with this worker, so its replacement takes over
+    _leader_lock = lock
+    start_background_jobs()
+
+app = create_app(start_background=False)
+preload()
+# Move everything loaded so far out of the collector's reach: collections in
+# the workers would otherwise write to (and un-share) those pages
+gc.freeze()